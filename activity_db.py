@@ -1,11 +1,16 @@
 # activity_db.py
 import sqlite3
+import argparse
+import random
+from datetime import date
 
 DATABASE = 'mindfulme.db'
+LOCAL_USER_ID = 1 # Owns data from before multi-user support; claimed with a token from `flask issue-token`
 
-def init_db():
-    """Initializes the SQLite database and creates the activity log and habits tables."""
-    conn = sqlite3.connect(DATABASE)
+def init_db(database=DATABASE):
+    """Initializes the SQLite database, creates the activity log and habits tables
+    and applies any pending schema migrations. Returns the schema version."""
+    conn = sqlite3.connect(database)
     cursor = conn.cursor()
     
     # Table to store user-logged activities (what they completed)
@@ -29,8 +34,781 @@ def init_db():
     ''')
 
     conn.commit()
+    version = migrate(conn)
     conn.close()
-    print(f"Database '{DATABASE}' initialized with 'activities' and 'habits' tables.")
+    return version
+
+# Day ordinal of a YYYY-MM-DD date in SQL; equal to Python's date.toordinal()
+DAY_ORDINAL_SQL = "CAST(julianday({date}) - 1721424.5 AS INTEGER)"
+
+# Rollup periods: SQL for the first day of the period containing {date} (YYYY-MM-DD).
+# Weeks are ISO weeks, so they start on Monday.
+ROLLUP_PERIODS = {
+    'day': "{date}",
+    'week': "date({date}, 'weekday 0', '-6 days')",
+    'month': "date({date}, 'start of month')",
+}
+
+# SQL for the id of the user an activity {row} belongs to (through its habit)
+OWNER_SQL = "(SELECT user_id FROM habits WHERE id = {row}.habit_id)"
+
+# meta key of a user's own change counter, in SQL ({user} is an expression) and in Python
+USER_VERSION_KEY_SQL = "'data_version:' || {user}"
+USER_VERSION_KEY = 'data_version:{user}'
+
+# Rollup dimensions: SQL for the key an activity {row} is counted under
+ROLLUP_DIMENSIONS = {
+    'habit': "(SELECT name FROM habits WHERE id = {row}.habit_id)",
+    'category': "COALESCE({row}.category, 'general')",
+}
+
+# --- Triggers ---
+# Migrations 7 and 8 rebuild the activities and habits tables, which drops their
+# triggers, so they recreate them with the same helpers the earlier migrations used.
+
+def _create_version_triggers(cursor, table):
+    """Makes any change to `table`, from any connection, bump data_version in the same transaction."""
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_bump_version
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE meta SET value = value + 1 WHERE key = 'data_version';
+            END
+        ''')
+
+def _bump_user_version_sql(user):
+    """SQL bumping the change counter of the user `user` (an expression; NULL is skipped)."""
+    return f'''
+        INSERT INTO meta (key, value)
+        SELECT key, 1 FROM (SELECT {USER_VERSION_KEY_SQL.format(user=user)} AS key) WHERE key IS NOT NULL
+        ON CONFLICT (key) DO UPDATE SET value = value + 1;
+    '''
+
+def _create_user_version_triggers(cursor):
+    """Makes any change to a user's habits or activities bump that user's own change counter too."""
+    owners = {
+        'activities': lambda row: OWNER_SQL.format(row=row),
+        'habits': lambda row: f'{row}.user_id',
+    }
+    for table, owner in owners.items():
+        events = {
+            'INSERT': _bump_user_version_sql(owner('NEW')),
+            'DELETE': _bump_user_version_sql(owner('OLD')),
+            'UPDATE': _bump_user_version_sql(owner('OLD')) + _bump_user_version_sql(owner('NEW')),
+        }
+        for event, body in events.items():
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_bump_user_version
+                AFTER {event} ON {table}
+                BEGIN
+                    {body}
+                END
+            ''')
+
+def _bump_all_user_versions(cursor):
+    """Bumps every user's change counter (after a rebuild of derived data)."""
+    cursor.execute("UPDATE meta SET value = value + 1 WHERE key GLOB 'data_version:*'")
+
+def _create_day_triggers(cursor):
+    """Keeps activities.day in sync for writers that only know about the TEXT date column."""
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS activities_fill_day
+        AFTER INSERT ON activities WHEN NEW.day IS NULL
+        BEGIN
+            UPDATE activities SET day = {DAY_ORDINAL_SQL.format(date='NEW.date')} WHERE id = NEW.id;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS activities_sync_day
+        AFTER UPDATE OF date ON activities
+        BEGIN
+            UPDATE activities SET day = {DAY_ORDINAL_SQL.format(date='NEW.date')} WHERE id = NEW.id;
+        END
+    ''')
+
+def _create_owner_triggers(cursor):
+    """Keeps activities.user_id equal to its habit's owner, for writers that don't set it."""
+    owner = OWNER_SQL.format(row='NEW')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS activities_fill_user
+        AFTER INSERT ON activities WHEN NEW.user_id IS NULL
+        BEGIN
+            UPDATE activities SET user_id = {owner} WHERE id = NEW.id;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS activities_sync_user
+        AFTER UPDATE OF habit_id ON activities
+        BEGIN
+            UPDATE activities SET user_id = {owner} WHERE id = NEW.id;
+        END
+    ''')
+
+def _create_rollup_triggers(cursor):
+    """Makes every write to activities adjust its rollups in the same transaction, whoever wrote it."""
+    def adjust(row, delta):
+        statements = []
+        owner = OWNER_SQL.format(row=row)
+        for period, start in ROLLUP_PERIODS.items():
+            bucket = DAY_ORDINAL_SQL.format(date=start.format(date=f'{row}.date'))
+            for dimension, key in ROLLUP_DIMENSIONS.items():
+                key = key.format(row=row)
+                statements.append(f'''
+                    INSERT INTO activity_rollups (user_id, period, dimension, key, bucket, completions)
+                    VALUES ({owner}, '{period}', '{dimension}', {key}, {bucket}, {delta})
+                    ON CONFLICT (user_id, period, dimension, key, bucket)
+                    DO UPDATE SET completions = completions + excluded.completions;
+                ''')
+                if delta < 0:
+                    # Drop emptied buckets by primary key, never by scanning for zeros
+                    statements.append(f'''
+                        DELETE FROM activity_rollups
+                        WHERE user_id = {owner} AND period = '{period}' AND dimension = '{dimension}'
+                          AND key = {key} AND bucket = {bucket} AND completions = 0;
+                    ''')
+        return ''.join(statements)
+
+    triggers = {
+        'insert': ('AFTER INSERT', adjust('NEW', 1)),
+        'delete': ('AFTER DELETE', adjust('OLD', -1)),
+        'update': ('AFTER UPDATE OF habit_id, date, category', adjust('OLD', -1) + adjust('NEW', 1)),
+    }
+    for name, (event, body) in triggers.items():
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS activities_{name}_rollups
+            {event} ON activities
+            BEGIN
+                {body}
+            END
+        ''')
+
+# --- Schema Migrations ---
+# Each migration runs exactly once, in order. The number of the last one applied
+# is stored in the database itself (PRAGMA user_version), so re-running is a no-op.
+
+def _migration_1_activity_indexes(cursor):
+    """Drops duplicate (name, date) logs and indexes the streak/duplicate lookups."""
+    cursor.execute('''
+        DELETE FROM activities
+        WHERE id NOT IN (SELECT MIN(id) FROM activities GROUP BY name, date)
+    ''')
+    # One log per activity per day; also covers "WHERE name = ? ORDER BY date"
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_activities_name_date ON activities (name, date)')
+    # Export and range queries order/filter by date alone
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_activities_date ON activities (date)')
+
+def _migration_2_habit_stats(cursor):
+    """Adds the incrementally maintained per-habit streak table."""
+    # Recreated by migration 4 (day ordinals) and 7 (habit ids), which fills it
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS habit_stats (
+            name TEXT PRIMARY KEY,
+            current_streak INTEGER NOT NULL, -- run of consecutive days ending at last_date
+            longest_streak INTEGER NOT NULL,
+            last_date TEXT NOT NULL
+        )
+    ''')
+
+def _migration_3_data_version(cursor):
+    """Adds the meta change counter that cached reads in every worker compare against."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('data_version', 0)")
+    for table in ('activities', 'habits'):
+        _create_version_triggers(cursor, table)
+
+def _migration_4_day_ordinals(cursor):
+    """Adds an integer day ordinal (date.toordinal()) next to each TEXT date and moves streaks onto it."""
+    cursor.execute('ALTER TABLE activities ADD COLUMN day INTEGER')
+    cursor.execute(f"UPDATE activities SET day = {DAY_ORDINAL_SQL.format(date='date')}")
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_activities_name_day ON activities (name, day)')
+    cursor.execute('DROP INDEX IF EXISTS idx_activities_date')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_activities_day ON activities (day)')
+    _create_day_triggers(cursor)
+
+    # Filled by migration 7, once activities reference habits by id
+    cursor.execute('DROP TABLE IF EXISTS habit_stats')
+    cursor.execute('''
+        CREATE TABLE habit_stats (
+            name TEXT PRIMARY KEY,
+            current_streak INTEGER NOT NULL, -- run of consecutive days ending at last_day
+            longest_streak INTEGER NOT NULL,
+            last_day INTEGER NOT NULL -- day ordinal of the most recent log
+        )
+    ''')
+
+def _migration_5_habit_days(cursor):
+    """Adds the persisted per-habit completion bitsets (filled by migration 7)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS habit_days (
+            name TEXT PRIMARY KEY,
+            first_day INTEGER NOT NULL, -- day ordinal of bit 0
+            bits BLOB NOT NULL, -- little-endian; bit i set = logged on first_day + i
+            version INTEGER NOT NULL -- meta data_version of the write that last changed it
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_habit_days_version ON habit_days (version)')
+
+def _migration_6_rollups(cursor):
+    """Adds per day/week/month completion counts by habit and by category.
+
+    Migration 8 recreates the table per user, adds the triggers that keep it
+    current on write, and backfills it.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS activity_rollups (
+            period TEXT NOT NULL, -- a ROLLUP_PERIODS key
+            dimension TEXT NOT NULL, -- a ROLLUP_DIMENSIONS key
+            key TEXT NOT NULL, -- habit name or category
+            bucket INTEGER NOT NULL, -- day ordinal of the period's first day
+            completions INTEGER NOT NULL,
+            PRIMARY KEY (period, dimension, key, bucket)
+        ) WITHOUT ROWID
+    ''')
+    # "Every key in a date range" reads
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_activity_rollups_bucket ON activity_rollups (period, dimension, bucket)')
+
+def _migration_7_habit_ids(cursor):
+    """Makes activities reference habits by integer habit_id instead of repeating the name.
+
+    Activity names without a habit become 'adhoc' habits. The table is rebuilt
+    without its name column, and the derived tables move to habit_id too.
+    """
+    cursor.execute('''
+        INSERT OR IGNORE INTO habits (name, frequency)
+        SELECT DISTINCT name, 'adhoc' FROM activities WHERE name NOT IN (SELECT name FROM habits)
+    ''')
+    # Keep the AUTOINCREMENT high-water mark, which delta export cursors rely on
+    row = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'activities'").fetchone()
+    sequence = row[0] if row else 0
+
+    cursor.execute('''
+        CREATE TABLE activities_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            habit_id INTEGER NOT NULL REFERENCES habits (id),
+            date TEXT NOT NULL,
+            day INTEGER, -- date.toordinal() of date
+            category TEXT,
+            status TEXT
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO activities_new (id, habit_id, date, day, category, status)
+        SELECT a.id, h.id, a.date, a.day, a.category, a.status
+        FROM activities a JOIN habits h ON h.name = a.name
+    ''')
+    cursor.execute('DROP TABLE activities')
+    cursor.execute('ALTER TABLE activities_new RENAME TO activities')
+    cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'activities'", (sequence,))
+
+    # One log per habit per day; also the foreign key index and the streak/missed lookups
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_activities_habit_day ON activities (habit_id, day)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_activities_day ON activities (day)')
+    _create_version_triggers(cursor, 'activities')
+    _create_day_triggers(cursor)
+
+    cursor.execute('DROP TABLE IF EXISTS habit_stats')
+    cursor.execute('''
+        CREATE TABLE habit_stats (
+            habit_id INTEGER PRIMARY KEY REFERENCES habits (id),
+            current_streak INTEGER NOT NULL, -- run of consecutive days ending at last_day
+            longest_streak INTEGER NOT NULL,
+            last_day INTEGER NOT NULL -- day ordinal of the most recent log
+        )
+    ''')
+    cursor.execute('DROP TABLE IF EXISTS habit_days')
+    cursor.execute('''
+        CREATE TABLE habit_days (
+            habit_id INTEGER PRIMARY KEY REFERENCES habits (id),
+            first_day INTEGER NOT NULL, -- day ordinal of bit 0
+            bits BLOB NOT NULL, -- little-endian; bit i set = logged on first_day + i
+            version INTEGER NOT NULL -- meta data_version of the write that last changed it
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_habit_days_version ON habit_days (version)')
+
+    # Derived tables are filled here, once, for every database migrating from an older schema
+    rebuild_habit_stats(cursor)
+    rebuild_habit_days(cursor)
+
+def _migration_8_users(cursor):
+    """Adds users and makes every habit (and through it, every activity) belong to one.
+
+    Existing data goes to LOCAL_USER_ID, the local user. Habit names become
+    unique per user, and the rollups, the only derived table not keyed by
+    habit_id, gain a user_id. (Session tokens later move to their own table in
+    migration 9, which also covers how the local user is signed in as.)
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            token_hash TEXT UNIQUE, -- SHA-256 of the session token; dropped by migration 9
+            created_at TEXT NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO users (id, created_at) VALUES (?, datetime('now'))", (LOCAL_USER_ID,))
+
+    row = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'habits'").fetchone()
+    sequence = row[0] if row else 0
+    # The rollup triggers read habits, so they go before the table is swapped out
+    for name in ('insert', 'delete', 'update'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS activities_{name}_rollups')
+    cursor.execute('''
+        CREATE TABLE habits_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            name TEXT NOT NULL,
+            frequency TEXT NOT NULL, -- e.g., 'daily'
+            UNIQUE (user_id, name) -- also the "a user's habits" index
+        )
+    ''')
+    # Ids are kept, so activities and the derived tables still point at the right habits
+    cursor.execute('''
+        INSERT INTO habits_new (id, user_id, name, frequency)
+        SELECT id, ?, name, frequency FROM habits
+    ''', (LOCAL_USER_ID,))
+    cursor.execute('DROP TABLE habits')
+    cursor.execute('ALTER TABLE habits_new RENAME TO habits')
+    cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'habits'", (sequence,))
+    _create_version_triggers(cursor, 'habits')
+
+    cursor.execute('DROP TABLE IF EXISTS activity_rollups')
+    cursor.execute('''
+        CREATE TABLE activity_rollups (
+            user_id INTEGER NOT NULL,
+            period TEXT NOT NULL, -- a ROLLUP_PERIODS key
+            dimension TEXT NOT NULL, -- a ROLLUP_DIMENSIONS key
+            key TEXT NOT NULL, -- habit name or category
+            bucket INTEGER NOT NULL, -- day ordinal of the period's first day
+            completions INTEGER NOT NULL,
+            PRIMARY KEY (user_id, period, dimension, key, bucket)
+        ) WITHOUT ROWID
+    ''')
+    # "Every key in a date range" reads
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_activity_rollups_bucket
+        ON activity_rollups (user_id, period, dimension, bucket)
+    ''')
+    _create_rollup_triggers(cursor)
+    rebuild_rollups(cursor)
+
+def _migration_9_sessions(cursor):
+    """Moves session tokens into their own table, so one user can hold several
+    (a browser's cookie, a device's API token).
+
+    Tokens already handed out keep working. The local user is no longer
+    claimed by whichever session comes first: in single-user mode every visitor
+    is the local user, and otherwise its tokens are issued explicitly.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            token_hash TEXT PRIMARY KEY, -- SHA-256 of the session token
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            created_at TEXT NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO sessions (token_hash, user_id, created_at)
+        SELECT token_hash, id, created_at FROM users WHERE token_hash IS NOT NULL
+    ''')
+
+    # A UNIQUE column can't be dropped in place, so users is rebuilt without token_hash
+    row = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'users'").fetchone()
+    sequence = row[0] if row else 0
+    cursor.execute('''
+        CREATE TABLE users_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT INTO users_new (id, created_at) SELECT id, created_at FROM users')
+    cursor.execute('DROP TABLE users')
+    cursor.execute('ALTER TABLE users_new RENAME TO users')
+    cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'users'", (sequence,))
+
+def _migration_10_activity_owners(cursor):
+    """Copies each activity's owner into activities.user_id, so a user's rows can be
+    read straight off an index in export order instead of gathered habit by
+    habit and sorted in a temp B-tree.
+    """
+    cursor.execute('ALTER TABLE activities ADD COLUMN user_id INTEGER REFERENCES users (id)')
+    cursor.execute('UPDATE activities SET user_id = (SELECT user_id FROM habits WHERE id = activities.habit_id)')
+    # Full exports walk (user_id, day) backwards; the implicit trailing id breaks ties in order.
+    # Delta exports walk (user_id) over id, which is its implicit second column.
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_activities_user_day ON activities (user_id, day)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_activities_user ON activities (user_id)')
+    _create_owner_triggers(cursor)
+
+def _migration_11_user_versions(cursor):
+    """Gives each user a change counter of their own in meta, next to the global one.
+
+    Cached reports compare against their user's counter, so one user's write
+    no longer invalidates everyone's. The global counter stays for the shared
+    completion bitsets, whose rows record it.
+    """
+    cursor.execute(f'''
+        INSERT OR IGNORE INTO meta (key, value)
+        SELECT {USER_VERSION_KEY_SQL.format(user='id')}, 0 FROM users
+    ''')
+    _create_user_version_triggers(cursor)
+
+MIGRATIONS = [
+    (1, _migration_1_activity_indexes),
+    (2, _migration_2_habit_stats),
+    (3, _migration_3_data_version),
+    (4, _migration_4_day_ordinals),
+    (5, _migration_5_habit_days),
+    (6, _migration_6_rollups),
+    (7, _migration_7_habit_ids),
+    (8, _migration_8_users),
+    (9, _migration_9_sessions),
+    (10, _migration_10_activity_owners),
+    (11, _migration_11_user_versions),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def migrate(conn):
+    """Applies pending migrations, one transaction each, and returns the schema version."""
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for target, migration in MIGRATIONS:
+        if target <= version:
+            continue
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Another process may have migrated while we waited for the lock
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if target > version:
+                migration(conn.cursor())
+                conn.execute(f'PRAGMA user_version = {target}')
+                version = target
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return version
+
+# --- Habit Streak Statistics ---
+
+# Streaks for every habit in one pass (gaps-and-islands): within a habit,
+# consecutive days share the same day - ROW_NUMBER() value, so each such group
+# is one run of consecutive daily logs. `last_run` is the most recent run, which
+# is the current streak if it ended today or yesterday.
+STREAKS_SQL = '''
+    WITH islands AS (
+        SELECT habit_id, day,
+               day - ROW_NUMBER() OVER (PARTITION BY habit_id ORDER BY day) AS island
+        FROM activities
+        {where}
+    ),
+    runs AS (
+        SELECT habit_id, COUNT(*) AS length, MAX(day) AS end_day,
+               ROW_NUMBER() OVER (PARTITION BY habit_id ORDER BY MAX(day) DESC) AS recency
+        FROM islands
+        GROUP BY habit_id, island
+    )
+    SELECT habit_id,
+           MAX(CASE WHEN recency = 1 THEN length END) AS last_run,
+           MAX(length) AS longest_streak,
+           MAX(end_day) AS last_day
+    FROM runs
+    GROUP BY habit_id
+'''
+
+def update_habit_stats(cursor, habit_id, logged_day):
+    """Updates habit_stats in O(1) after a new log of habit `habit_id` on day ordinal `logged_day`.
+
+    Must run in the same transaction as the INSERT into activities. A log dated
+    before the habit's last log (a backfill) falls back to rebuilding that habit.
+    """
+    row = cursor.execute(
+        "SELECT current_streak, longest_streak, last_day FROM habit_stats WHERE habit_id = ?", (habit_id,)
+    ).fetchone()
+    if row is None:
+        cursor.execute(
+            "INSERT INTO habit_stats (habit_id, current_streak, longest_streak, last_day) VALUES (?, 1, 1, ?)",
+            (habit_id, logged_day)
+        )
+        return
+
+    current, longest, last_day = row
+    if logged_day == last_day:
+        return
+    if logged_day < last_day:
+        rebuild_habit_stats(cursor, [habit_id])
+        return
+
+    current = current + 1 if logged_day - last_day == 1 else 1
+    cursor.execute(
+        "UPDATE habit_stats SET current_streak = ?, longest_streak = ?, last_day = ? WHERE habit_id = ?",
+        (current, max(longest, current), logged_day, habit_id)
+    )
+
+def rebuild_habit_stats(cursor, habit_ids=None):
+    """Recomputes habit_stats from the full activity history (for all habits, or just `habit_ids`)."""
+    where, params = '', []
+    if habit_ids is not None:
+        params = list(habit_ids)
+        where = f"WHERE habit_id IN ({', '.join('?' * len(params))})"
+    cursor.execute(f"DELETE FROM habit_stats {where}", params)
+    return cursor.execute(f'''
+        INSERT INTO habit_stats (habit_id, current_streak, longest_streak, last_day)
+        SELECT habit_id, last_run, longest_streak, last_day FROM ({STREAKS_SQL.format(where=where)})
+    ''', params).rowcount
+
+# --- Habit Completion Bitsets ---
+# One bitset per habit, packed into a BLOB (~46 bytes per habit-year).
+# Rows carry the data_version of the write that changed them, so workers keep
+# their in-memory copy current by loading only rows newer than what they hold.
+
+def _save_habit_days(cursor, habit_id, first_day, bits):
+    cursor.execute(
+        "INSERT OR REPLACE INTO habit_days (habit_id, first_day, bits, version) "
+        "VALUES (?, ?, ?, (SELECT value FROM meta WHERE key = 'data_version'))",
+        (habit_id, first_day, bits.to_bytes((bits.bit_length() + 7) // 8, 'little'))
+    )
+
+def update_habit_days(cursor, habit_id, logged_day):
+    """Sets the bit for a new log of habit `habit_id` on day ordinal `logged_day`.
+
+    Must run in the same transaction as the INSERT into activities, whose
+    trigger has already bumped data_version.
+    """
+    row = cursor.execute("SELECT first_day, bits FROM habit_days WHERE habit_id = ?", (habit_id,)).fetchone()
+    first_day, bits = (row[0], int.from_bytes(row[1], 'little')) if row and row[1] else (logged_day, 0)
+    if logged_day < first_day:
+        bits <<= first_day - logged_day
+        first_day = logged_day
+    _save_habit_days(cursor, habit_id, first_day, bits | 1 << (logged_day - first_day))
+
+def rebuild_habit_days(cursor, habit_ids=None):
+    """Recomputes habit_days from the full activity history (for all habits, or just `habit_ids`).
+
+    Habits left without any logs keep an empty bitset, so workers drop their bits too.
+    Returns the number of bitsets written.
+    """
+    # Bump first so every rewritten row is newer than anything a worker has loaded
+    cursor.execute("UPDATE meta SET value = value + 1 WHERE key = 'data_version'")
+    where, params = '', []
+    if habit_ids is not None:
+        params = list(habit_ids)
+        where = f"AND habit_id IN ({', '.join('?' * len(params))})"
+        stale = set(params)
+        # The owners' cached reports may show the old streaks
+        cursor.execute(f'''
+            UPDATE meta SET value = value + 1 WHERE key IN (
+                SELECT {USER_VERSION_KEY_SQL.format(user='user_id')} FROM habits WHERE id IN ({', '.join('?' * len(params))})
+            )
+        ''', params)
+    else:
+        stale = {row[0] for row in cursor.execute("SELECT habit_id FROM habit_days").fetchall()}
+        _bump_all_user_versions(cursor)
+
+    bitsets = {}
+    rows = cursor.execute(
+        f"SELECT habit_id, day FROM activities WHERE day IS NOT NULL {where} ORDER BY habit_id, day", params
+    ).fetchall()
+    for habit_id, day in rows:
+        first_day, offsets = bitsets.setdefault(habit_id, (day, []))
+        offsets.append(day - first_day)
+    for habit_id, (first_day, offsets) in bitsets.items():
+        _save_habit_days(cursor, habit_id, first_day, sum(1 << offset for offset in offsets))
+    for habit_id in stale - bitsets.keys():
+        _save_habit_days(cursor, habit_id, 0, 0)
+    return len(bitsets)
+
+def rebuild_stats(database=DATABASE):
+    """Repairs habit_stats and habit_days by rebuilding them from activities. Returns the number of habits."""
+    conn = sqlite3.connect(database)
+    with conn:
+        count = rebuild_habit_stats(conn.cursor())
+        # Also bumps data_version, so repaired streaks don't hide behind cached reports
+        rebuild_habit_days(conn.cursor())
+    conn.close()
+    return count
+
+# --- Rollups ---
+
+def rebuild_rollups(cursor):
+    """Recomputes activity_rollups from activities (the backfill). Returns the number of rollup rows."""
+    cursor.execute("DELETE FROM activity_rollups")
+    for period, start in ROLLUP_PERIODS.items():
+        for dimension, key in ROLLUP_DIMENSIONS.items():
+            cursor.execute(f'''
+                INSERT INTO activity_rollups (user_id, period, dimension, key, bucket, completions)
+                SELECT user_id, '{period}', '{dimension}', key, bucket, COUNT(*)
+                FROM (
+                    SELECT {OWNER_SQL.format(row='a')} AS user_id,
+                           {key.format(row='a')} AS key,
+                           {DAY_ORDINAL_SQL.format(date=start.format(date='a.date'))} AS bucket
+                    FROM activities a
+                )
+                WHERE bucket IS NOT NULL
+                GROUP BY user_id, key, bucket
+            ''')
+    # Rewritten rollups must not hide behind reports cached by running workers
+    cursor.execute("UPDATE meta SET value = value + 1 WHERE key = 'data_version'")
+    _bump_all_user_versions(cursor)
+    return cursor.execute("SELECT COUNT(*) FROM activity_rollups").fetchone()[0]
+
+def backfill_rollups(database=DATABASE):
+    """Rebuilds activity_rollups from activities. Returns the number of rollup rows."""
+    conn = sqlite3.connect(database)
+    with conn:
+        count = rebuild_rollups(conn.cursor())
+    conn.close()
+    return count
+
+# --- Synthetic Data ---
+# Reproducible databases for benchmarks: the same arguments and seed (and end
+# date) always produce the same users, habits and activities.
+
+HABIT_NAMES = ['Run', 'Read', 'Meditate', 'Journal', 'Stretch', 'Drink Water', 'Study', 'Walk',
+               'Yoga', 'Sleep Early', 'Cook', 'Practice Guitar']
+CATEGORIES = ['health', 'fitness', 'mind', 'learning', 'general']
+
+def _streaky_days(rng, span):
+    """Long runs with occasional breaks: a two-state chain that mostly stays where it is."""
+    days, on = [], rng.random() < 0.8
+    for offset in range(span):
+        on = rng.random() < (0.93 if on else 0.25)
+        if on:
+            days.append(offset)
+    return days
+
+def _sporadic_days(rng, span):
+    """Independent logs on about a third of the days."""
+    return [offset for offset in range(span) if rng.random() < 0.35]
+
+def _lapsed_days(rng, span):
+    """Streaky at first, then almost abandoned."""
+    lapse = int(span * rng.uniform(0.2, 0.7))
+    return _streaky_days(rng, lapse) + [offset for offset in range(lapse, span) if rng.random() < 0.03]
+
+# Adherence patterns: pattern -> days_fn(rng, span) returning ascending day offsets
+ADHERENCE_PATTERNS = {
+    'streaky': _streaky_days,
+    'sporadic': _sporadic_days,
+    'lapsed': _lapsed_days,
+}
+
+# Named fixture sizes: name -> (users, habits per user, years); about 10k, 1M and 10M activities
+FIXTURES = {
+    '10k': (12, 5, 1),
+    '1m': (550, 5, 2),
+    '10m': (2190, 5, 5),
+}
+
+def _run_stats(days):
+    """Returns (current run ending at the last day, longest run) for ascending day ordinals."""
+    current = longest = 0
+    for index, day in enumerate(days):
+        current = current + 1 if index and day - days[index - 1] == 1 else 1
+        longest = max(longest, current)
+    return current, longest
+
+def generate_data(database=DATABASE, users=1, habits=5, years=1, pattern='mixed', seed=0, end=None):
+    """Fills an empty database with `users` users x `habits` daily habits x `years` of activities.
+
+    `pattern` is an ADHERENCE_PATTERNS key, or 'mixed' to pick one per habit.
+    The first user is LOCAL_USER_ID. Everything is loaded with executemany in one
+    transaction; the rollup and per-user version triggers on activities are
+    suspended meanwhile and the derived tables filled directly. Returns the number of activities.
+    """
+    if pattern != 'mixed' and pattern not in ADHERENCE_PATTERNS:
+        raise ValueError(f"pattern must be 'mixed' or one of {list(ADHERENCE_PATTERNS)}")
+    init_db(database)
+    rng = random.Random(seed)
+    end = (end or date.today()).toordinal()
+    span = 365 * years
+    first = end - span + 1
+    names = [HABIT_NAMES[i % len(HABIT_NAMES)] + (f' {i // len(HABIT_NAMES) + 1}' if i >= len(HABIT_NAMES) else '')
+             for i in range(habits)]
+
+    conn = sqlite3.connect(database)
+    conn.execute('PRAGMA cache_size = -262144')  # ~256 MB, so index pages stay in memory during the load
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        if cursor.execute('SELECT 1 FROM habits LIMIT 1').fetchone():
+            raise ValueError(f"'{database}' already has data; generate into a new database.")
+        for name in ('insert', 'delete', 'update'):
+            cursor.execute(f'DROP TRIGGER activities_{name}_rollups')
+            # Each user's counter is bumped by their habit inserts; one bump per activity isn't needed
+            cursor.execute(f'DROP TRIGGER activities_{name}_bump_user_version')
+
+        cursor.executemany("INSERT OR IGNORE INTO users (id, created_at) VALUES (?, datetime('now'))",
+                           [(LOCAL_USER_ID + i,) for i in range(users)])
+        total = 0
+        for user_id in range(LOCAL_USER_ID, LOCAL_USER_ID + users):
+            stats, bitsets = [], []
+            for name in names:
+                habit_id = cursor.execute("INSERT INTO habits (user_id, name, frequency) VALUES (?, ?, 'daily')",
+                                          (user_id, name)).lastrowid
+                days_fn = ADHERENCE_PATTERNS[pattern if pattern != 'mixed' else rng.choice(list(ADHERENCE_PATTERNS))]
+                days = [first + offset for offset in days_fn(rng, span)]
+                category = rng.choice(CATEGORIES)
+                cursor.executemany(
+                    "INSERT INTO activities (habit_id, user_id, date, day, category, status) "
+                    "VALUES (?, ?, ?, ?, ?, 'completed')",
+                    [(habit_id, user_id, date.fromordinal(day).isoformat(), day, category) for day in days]
+                )
+                total += len(days)
+                if days:
+                    stats.append((habit_id, *_run_stats(days), days[-1]))
+                    bitsets.append((habit_id, days[0], sum(1 << (day - days[0]) for day in days)))
+            cursor.executemany(
+                "INSERT INTO habit_stats (habit_id, current_streak, longest_streak, last_day) VALUES (?, ?, ?, ?)",
+                stats
+            )
+            for habit_id, first_day, bits in bitsets:
+                _save_habit_days(cursor, habit_id, first_day, bits)
+
+        rebuild_rollups(cursor)
+        _create_rollup_triggers(cursor)
+        _create_user_version_triggers(cursor)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return total
 
 if __name__ == '__main__':
-    init_db()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="MindfulMe database tools.")
+    parser.add_argument('command', nargs='?', default='init',
+                        choices=['init', 'rebuild-stats', 'rebuild-rollups', 'generate'],
+                        help="'init' creates/migrates the database (default); 'rebuild-stats' repairs streak stats; "
+                             "'rebuild-rollups' backfills the day/week/month rollups; "
+                             "'generate' fills a new database with synthetic data")
+    parser.add_argument('--database', default=DATABASE)
+    parser.add_argument('--fixture', choices=list(FIXTURES), help="generate: a named size (sets users/habits/years)")
+    parser.add_argument('--users', type=int, default=1, help="generate: number of users")
+    parser.add_argument('--habits', type=int, default=5, help="generate: daily habits per user")
+    parser.add_argument('--years', type=int, default=1, help="generate: years of history, ending today")
+    parser.add_argument('--pattern', default='mixed', choices=['mixed', *ADHERENCE_PATTERNS],
+                        help="generate: adherence pattern ('mixed' picks one per habit)")
+    parser.add_argument('--seed', type=int, default=0, help="generate: random seed")
+    parser.add_argument('--end', type=date.fromisoformat, help="generate: last day (YYYY-MM-DD) instead of today")
+    args = parser.parse_args()
+
+    version = init_db(args.database)
+    if args.command == 'init':
+        print(f"Database '{args.database}' initialized with 'activities' and 'habits' tables (schema version {version}).")
+    elif args.command == 'rebuild-stats':
+        print(f"Rebuilt streak stats for {rebuild_stats(args.database)} habits in '{args.database}'.")
+    elif args.command == 'rebuild-rollups':
+        print(f"Rebuilt {backfill_rollups(args.database)} rollup rows in '{args.database}'.")
+    elif args.command == 'generate':
+        users, habits, years = FIXTURES[args.fixture] if args.fixture else (args.users, args.habits, args.years)
+        try:
+            count = generate_data(args.database, users, habits, years, args.pattern, args.seed, args.end)
+        except ValueError as error:
+            parser.exit(1, f"{error}\n")
+        print(f"Generated {count} activities for {users} users x {habits} habits x {years} years in '{args.database}'.")
\ No newline at end of file
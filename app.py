@@ -1,226 +1,1139 @@
 # app.py
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, make_response, Response, g, has_request_context, stream_with_context
 from flask_cors import CORS 
 import sqlite3
 import re
-from datetime import datetime, timedelta
+import html
+from contextlib import closing, contextmanager, nullcontext, ExitStack
+from datetime import date, datetime
+from itertools import chain
+import click
+import csv
+import gzip
+import hashlib
 import io
+import json
+import os
+import secrets
+import tempfile
+import threading
+import zlib
+from functools import wraps
+from storage import ConnectionPool, ShardedPool, ShardLocal, DatabaseWriter, VersionedCache, CompletionIndex, WAL_PRAGMAS
+from activity_db import (init_db, update_habit_stats, rebuild_habit_stats, update_habit_days, rebuild_habit_days,
+                         DAY_ORDINAL_SQL, ROLLUP_PERIODS, ROLLUP_DIMENSIONS, LOCAL_USER_ID, USER_VERSION_KEY)
 
 # --- Configuration ---
 app = Flask(__name__)
 CORS(app) 
 DATABASE = 'mindfulme.db'
+POOL_SIZE = 5 # Max open connections per worker process
+# 'default' uses SQLite's rollback journal and writes inline.
+# 'wal' turns on WAL + busy_timeout and funnels all writes through one writer thread
+# (use it when running several worker processes/threads).
+# 'sharded' gives each user their own WAL database file under SHARD_DIR, so one
+# user's long write never blocks another's; mindfulme.db keeps only the users.
+STORAGE_MODE = os.environ.get('MINDFULME_STORAGE_MODE', 'default')
+SHARD_DIR = os.environ.get('MINDFULME_SHARD_DIR', 'shards') # Per-user databases in 'sharded' mode
+SHARD_MAX_OPEN = 64 # Max open shard connections per worker process, across all users
+SHARD_CACHES = 1024 # Shards whose report cache and completion bitsets stay in memory
+WRITE_QUEUE_SIZE = 1000 # Max writes waiting for the writer thread
+WRITE_BATCH_SIZE = 100 # Max writes grouped into one commit
+EXPORT_CHUNK_SIZE = 1000 # Rows read per query (and streamed per chunk) by an export
+EXPORT_FIELDS = ('name', 'date', 'category', 'status') # NDJSON keys of an exported row
+SNAPSHOT_BLOCK_SIZE = 64 * 1024 # Bytes per streamed chunk of a SQLite snapshot
+# /download_logs?format= -> (mimetype, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'csv.gz': ('application/gzip', 'csv.gz'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'sqlite': ('application/vnd.sqlite3', 'db'),
+}
+BULK_MAX_RECORDS = 10000 # Max records accepted by one /api/activities/bulk request
+BULK_STATS_CHUNK = 500 # Habits per statement when resolving ids or rebuilding stats after a bulk insert
+IMPORT_BATCH_SIZE = 5000 # CSV rows written per transaction by the importer
+IMPORT_MAX_REJECTS = 100 # Rejected CSV rows listed in an import summary
+IMPORT_MAX_BATCH_SIZE = 50000 # Cap on a caller's ?batch_size=, so one batch stays small in memory
+MISSED_WINDOWS = (7, 30, 90, 365) # Lookback windows (days) for the missed-habits report; first is the default
+CACHE_SIZE = 256 # Max cached reports (show habits, streaks, missed) per worker process
+# Off (the default), the app stays single-user: a visitor without a session is the
+# local user, who owns every row from before sessions existed. On, each new visitor
+# gets an account of their own on their first write.
+MULTI_USER = os.environ.get('MINDFULME_MULTI_USER', '0') == '1'
+SESSION_COOKIE = 'mindfulme_session' # Cookie holding the visitor's session token
+SESSION_HEADER = 'X-MindfulMe-Token' # Header API clients send their session token in (and get a new one back in)
+SESSION_MAX_AGE = 365 * 24 * 3600 # Seconds before the session cookie expires
+PUBLIC_ENDPOINTS = ('static', 'db_stats') # Endpoints that never read a user's data, so skip the session lookup
+
+def shard_path(user_id):
+    """Returns the path of a user's database in 'sharded' mode."""
+    return os.path.join(SHARD_DIR, f'user_{user_id}.db')
+
+def prepare_shard(user_id, path):
+    """Creates (or migrates) a user's shard and adds the users row its habits reference."""
+    init_db(path)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("INSERT OR IGNORE INTO users (id, created_at) VALUES (?, datetime('now'))", (user_id,))
+    conn.close()
+
+# Create tables and apply pending schema migrations before serving anything
+init_db(DATABASE)
+
+db_shards = None
+if STORAGE_MODE == 'wal':
+    db_pool = ConnectionPool(DATABASE, size=POOL_SIZE, pragmas=WAL_PRAGMAS)
+    db_writer = DatabaseWriter(db_pool._connect, max_queue=WRITE_QUEUE_SIZE, max_batch=WRITE_BATCH_SIZE)
+elif STORAGE_MODE == 'sharded':
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    db_pool = ConnectionPool(DATABASE, size=POOL_SIZE, pragmas=WAL_PRAGMAS)
+    db_shards = ShardedPool(shard_path, max_open=SHARD_MAX_OPEN, pragmas=WAL_PRAGMAS, prepare=prepare_shard)
+    db_writer = None
+else:
+    db_pool = ConnectionPool(DATABASE, size=POOL_SIZE)
+    db_writer = None
+
+report_cache = VersionedCache(max_entries=CACHE_SIZE)
+completion_index = CompletionIndex()
+# Every shard numbers its own data versions and habit ids, so each gets its own pair
+shard_caches = ShardLocal(lambda: (VersionedCache(max_entries=CACHE_SIZE), CompletionIndex()), SHARD_CACHES)
 
 # --- Database Helper Functions ---
 
+_thread_scope = threading.local() # Connection state for code running outside a request
+
+def _db_scope():
+    """Where the current unit of work lives: Flask's g during a request, the thread otherwise."""
+    return g if has_request_context() else _thread_scope
+
+def _pooled_connection():
+    """Checks out a connection to the current user's database: their shard in 'sharded' mode.
+
+    A request with no user yet reads the directory database, which holds no one's data.
+    """
+    if db_shards is not None and current_user_id() is not None:
+        return db_shards.connection(current_user_id())
+    return db_pool.connection()
+
 def get_db_connection():
-    """Returns a connection to the SQLite database."""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Returns a pooled connection to the SQLite database (use it in a 'with' block).
+
+    During a request the connection is checked out on first use, bound to g and
+    shared by every helper until the request's teardown hook returns it.
+    """
+    if not has_request_context():
+        return _pooled_connection()
+    if 'db_conn' not in g:
+        g.db_lease = ExitStack()
+        g.db_conn = g.db_lease.enter_context(_pooled_connection())
+    return nullcontext(g.db_conn)
+
+@contextmanager
+def unit_of_work():
+    """Runs every database helper call inside the block on one connection and one transaction.
+
+    Commits when the block exits normally and rolls everything back if it raises.
+    Nested blocks join the outer unit of work.
+    """
+    scope = _db_scope()
+    if getattr(scope, 'uow_conn', None) is not None:
+        yield scope.uow_conn
+        return
+
+    with get_db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        scope.uow_conn = conn
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            scope.uow_conn = None
+
+def _request_transaction():
+    """Begins the request's own transaction on first write; commit_db commits it."""
+    with get_db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        g.uow_conn = conn
+        return conn
+
+def commit_request_transaction():
+    """Commits a request's writes so far; the next write opens a new transaction.
+
+    Long-running requests (CSV imports) call this between batches.
+    """
+    conn = g.pop('uow_conn', None) if has_request_context() else None
+    if conn is not None:
+        conn.commit()
+
+def release_request_connection():
+    """Rolls back whatever the request left uncommitted and returns its connection."""
+    lease = g.pop('db_lease', None)
+    if lease is None:
+        return
+    conn = g.pop('db_conn')
+    g.pop('uow_conn', None)
+    with lease:
+        if conn.in_transaction:
+            conn.rollback()
+
+def run_write(job):
+    """Runs job(conn) in one transaction: on the writer thread in 'wal' mode, inline otherwise.
+
+    Inside a unit of work the job runs on its connection instead, in a SAVEPOINT
+    so a failed job (e.g. a duplicate habit) doesn't undo the rest of the unit.
+    Outside 'wal' mode every write in a request joins the request's transaction.
+    """
+    conn = getattr(_db_scope(), 'uow_conn', None)
+    if conn is None and db_writer is None and has_request_context():
+        conn = _request_transaction()
+    if conn is not None:
+        conn.execute("SAVEPOINT job")
+        try:
+            result = job(conn)
+        except Exception:
+            conn.execute("ROLLBACK TO job")
+            raise
+        finally:
+            conn.execute("RELEASE job")
+        return result
+
+    if db_writer is not None:
+        return db_writer.submit(job)
+    with get_db_connection() as conn:
+        try:
+            # Take the write lock up front so check-then-write jobs are atomic
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            result = job(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return result
+
+# --- Users ---
+# A user is identified by random session tokens: the browser's, kept in a cookie,
+# and any issued to API clients, sent in the SESSION_HEADER header. Only each
+# token's SHA-256 is stored. With MULTI_USER on, a visitor becomes a user on their
+# first write; otherwise visitors without a session are the local user.
+# Habits, activities and rollups each carry their owner's user_id; the streak and
+# bitset tables are keyed by habit id, which is already per user.
+
+def current_user_id():
+    """Returns the id of the user the request (or, outside a request, the thread) acts for.
+
+    A request without a session acts for the local user unless MULTI_USER is on;
+    then it has none (None), so it reads as an empty account. Jobs handed to run_write may run on the writer thread, so they must capture
+    this beforehand rather than call it themselves.
+    """
+    return getattr(_db_scope(), 'user_id', None if MULTI_USER and has_request_context() else LOCAL_USER_ID)
+
+def ensure_user():
+    """Returns the current user's id, first starting a new user's session if the request has none.
+
+    Every write path calls this before it writes (and before opening a unit of
+    work), so requests that only read never create users.
+    """
+    user_id = current_user_id()
+    if user_id is not None:
+        return user_id
+    if db_shards is not None:
+        # Reads so far went to the directory; from here on the request uses the new user's shard
+        release_request_connection()
+    token = secrets.token_urlsafe(32)
+    g.user_id = run_directory_write(lambda conn: create_user(conn, hash_token(token)))
+    g.new_session_token = token
+    return g.user_id
+
+@contextmanager
+def acting_as(user_id):
+    """Makes code in the block (CLI commands, benchmarks) act for `user_id`."""
+    scope = _db_scope()
+    previous = current_user_id()
+    scope.user_id = user_id
+    try:
+        yield
+    finally:
+        scope.user_id = previous
+
+def fetch_directory(query, params=()):
+    """Like fetch_all, but against the users directory, which stays in mindfulme.db in every mode."""
+    with db_pool.connection() as conn:
+        return conn.execute(query, params).fetchall()
+
+def run_directory_write(job):
+    """Like run_write, but against the users directory."""
+    if db_shards is None:
+        return run_write(job)
+    with db_pool.connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = job(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return result
+
+def hash_token(token):
+    """Returns the stored form of a session token."""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def create_user(conn, token_hash):
+    """Adds a user with one session and returns its id."""
+    user_id = conn.execute("INSERT INTO users (created_at) VALUES (datetime('now'))").lastrowid
+    issue_token(conn, user_id, token_hash)
+    return user_id
+
+def issue_token(conn, user_id, token_hash):
+    """Adds a session for an existing user."""
+    conn.execute(
+        "INSERT INTO sessions (token_hash, user_id, created_at) VALUES (?, ?, datetime('now'))", (token_hash, user_id)
+    )
+
+def find_session_user(token):
+    """Returns the id of the user a session token belongs to, or None."""
+    rows = fetch_directory("SELECT user_id FROM sessions WHERE token_hash = ?", (hash_token(token),))
+    return rows[0]['user_id'] if rows else None
+
+# --- Report Cache ---
+
+def database_caches():
+    """Returns the (report cache, completion index) pair for the current user's database."""
+    if db_shards is not None:
+        return shard_caches.get(current_user_id())
+    return report_cache, completion_index
+
+def data_version():
+    """Returns the database's change counter.
+
+    Triggers on activities and habits bump it inside every writing transaction,
+    whichever process or connection wrote, so comparing it is enough to tell
+    whether something loaded earlier (the completion bitsets) is stale.
+    It's a single primary-key lookup.
+    """
+    return fetch_all("SELECT value FROM meta WHERE key = 'data_version'")[0]['value']
+
+def user_data_version():
+    """Returns the current user's own change counter, bumped by the same triggers
+    but only for writes to that user's habits and activities."""
+    rows = fetch_all("SELECT value FROM meta WHERE key = ?", (USER_VERSION_KEY.format(user=current_user_id()),))
+    return rows[0]['value'] if rows else 0
+
+def cached_report(fn):
+    """Caches fn(*args) in report_cache, keyed by the current user, their data version and the day.
+
+    Inside an open unit of work the caller may see its own uncommitted writes,
+    which the cache knows nothing about, so those reads go straight to the database.
+    """
+    @wraps(fn)
+    def wrapper(*args):
+        if getattr(_db_scope(), 'uow_conn', None) is not None:
+            return fn(*args)
+        key = (fn.__name__, current_user_id()) + args
+        return database_caches()[0].get_or_compute(key, lambda: fn(*args), user_data_version())
+    return wrapper
+
+# --- Completion Bitsets ---
+
+def completion_bitsets(habit_ids=None):
+    """Returns the per-habit completion bitsets, keyed by habit id and current with the database.
+
+    The shared index loads only the habit_days rows changed since it was last
+    used. Inside an open unit of work the rows (just `habit_ids`, if given) go into
+    a throwaway index instead, so uncommitted writes never reach the shared one.
+    """
+    if getattr(_db_scope(), 'uow_conn', None) is not None:
+        where, params = '', ()
+        if habit_ids is not None:
+            params = tuple(habit_ids)
+            where = f"WHERE habit_id IN ({', '.join('?' * len(params))})"
+        return CompletionIndex().refresh(
+            0, lambda since: fetch_all(f"SELECT habit_id, first_day, bits FROM habit_days {where}", params)
+        )
+    return database_caches()[1].refresh(
+        data_version(),
+        lambda since: fetch_all(
+            "SELECT habit_id, first_day, bits FROM habit_days WHERE version > ?", (-1 if since is None else since,)
+        )
+    )
+
+def find_habit_id(name):
+    """Returns the id of the current user's habit called `name` (already title-cased), or None."""
+    rows = fetch_all("SELECT id FROM habits WHERE user_id = ? AND name = ?", (current_user_id(), name))
+    return rows[0]['id'] if rows else None
 
 def execute_query(query, params=()):
-    """Execute a query and close connection (for INSERT, UPDATE, DELETE)."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(query, params)
-    conn.commit()
-    conn.close()
-    return cursor
+    """Execute a query and commit (for INSERT, UPDATE, DELETE)."""
+    return run_write(lambda conn: conn.execute(query, params))
 
 def fetch_all(query, params=()):
     """Fetch all results (for SELECT)."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    with get_db_connection() as conn:
+        return conn.execute(query, params).fetchall()
+
+def is_valid_date(value):
+    """Checks that a string is a real YYYY-MM-DD date."""
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+        return True
+    except ValueError:
+        return False
+
+# Dates are stored both as TEXT (YYYY-MM-DD) and as integer day ordinals
+# (date.toordinal()); streak, missed and range logic works on the ordinals.
+
+def today_ordinal():
+    """Returns today's day ordinal."""
+    return date.today().toordinal()
+
+def day_ordinal(value):
+    """Converts a YYYY-MM-DD string to its day ordinal."""
+    return date.fromisoformat(value).toordinal()
+
+def ordinal_to_date(day):
+    """Converts a day ordinal back to a YYYY-MM-DD string."""
+    return date.fromordinal(day).isoformat()
 
 # --- Advanced Functionality ---
 
+def current_streak(streak, last_day, today=None):
+    """Turns a stored run (streak days ending at day ordinal last_day) into today's current streak.
+
+    We don't penalize for missing today yet: a run ending yesterday still counts.
+    """
+    if last_day is None:
+        return 0
+    today = today or today_ordinal()
+    return streak if today - last_day in (0, 1) else 0
+
+def bitset_streak(bitsets, habit_id, today):
+    """Today's current streak from a completion bitset; as in current_streak, a run ending yesterday still counts."""
+    return bitsets.run_ending(habit_id, today) or bitsets.run_ending(habit_id, today - 1)
+
+@cached_report
 def calculate_streak(habit_name):
-    """Calculates the current consecutive daily streak for a habit."""
-    # Fetch all logged dates for this habit, sorted newest to oldest
-    logs = fetch_all(
-        "SELECT date FROM activities WHERE name = ? ORDER BY date DESC", 
-        (habit_name.title(),)
-    )
-    
-    if not logs:
+    """Returns the current consecutive daily streak for a habit from its completion bitset."""
+    habit_id = find_habit_id(habit_name.title())
+    if habit_id is None:
         return 0
-    
-    current_streak = 0
-    
-    # Start checking from yesterday. We don't penalize for missing today yet.
-    # Today's date is only part of the streak if it's already logged.
-    today = datetime.now().date()
-    yesterday = today - timedelta(days=1)
-    
-    # Check if the habit was logged today
-    logged_dates = {datetime.strptime(row['date'], "%Y-%m-%d").date() for row in logs}
-    
-    if today in logged_dates:
-        current_streak = 1
-        check_date = yesterday
+    return bitset_streak(completion_bitsets([habit_id]), habit_id, today_ordinal())
+
+@cached_report
+def compute_all_streaks():
+    """Computes current and longest streaks for every habit from the completion bitsets."""
+    habits = fetch_all(
+        "SELECT id, name, frequency FROM habits WHERE user_id = ? AND frequency != 'adhoc' ORDER BY id",
+        (current_user_id(),)
+    )
+    bitsets = completion_bitsets([habit['id'] for habit in habits])
+    today = today_ordinal()
+    streaks = []
+    for habit in habits:
+        last_day = bitsets.last_day(habit['id'])
+        streaks.append({
+            "habit": habit['name'],
+            "frequency": habit['frequency'],
+            "current_streak": bitset_streak(bitsets, habit['id'], today),
+            "longest_streak": bitsets.longest_run(habit['id']),
+            "last_date": ordinal_to_date(last_day) if last_day else None,
+        })
+    return streaks
+
+def iter_activity_rows(date_from=None, date_to=None, habit=None, since=None, until=None):
+    """Yields the current user's activity rows, as (name, date, category, status) tuples,
+    in lists of EXPORT_CHUNK_SIZE.
+
+    Rows come newest first. For a delta export (`since` given) only rows with
+    since < id <= until are returned, in id order. Each chunk is its own short
+    keyset query, so no read lock is held while the previous chunk is being sent
+    (a row written mid-export shows up if it sorts after the current position).
+    """
+    if habit:
+        # The habit id already belongs to this user, and leads the tighter (habit_id, day) index
+        clauses, params = ["a.habit_id = ?"], [find_habit_id(habit.title())]
     else:
-        check_date = yesterday
-        current_streak = 0
-        
-    while True:
-        if check_date in logged_dates:
-            current_streak += 1
-            check_date -= timedelta(days=1)
-        # Stop if we hit a date that wasn't logged, or if we go too far back
-        elif check_date < today - timedelta(days=365): 
-             break 
-        elif check_date < today:
-             break 
-        else:
-            break
-            
-    return current_streak
-
-def export_data_to_csv():
-    """Exports all activity data to a CSV formatted string."""
-    logs = fetch_all("SELECT name, date, category, status FROM activities ORDER BY date DESC")
-    
-    if not logs:
+        clauses, params = ["a.user_id = ?"], [current_user_id()]
+    if date_from:
+        clauses.append("a.day >= ?")
+        params.append(day_ordinal(date_from))
+    if date_to:
+        clauses.append("a.day <= ?")
+        params.append(day_ordinal(date_to))
+    # Each pass is (filter, order, key columns, start): every order is index order
+    # (idx_activities_user / idx_activities_user_day, or the habit/day index with
+    # ?habit=), so each chunk is a short range scan that resumes after the key of
+    # the previous chunk's last row.
+    if since is not None:
+        clauses.append("a.id <= ?")
+        params.append(until)
+        passes = [("TRUE", "a.id", ('id',), (since,))]
+    else:
+        passes = [("a.day IS NOT NULL", "a.day DESC, a.id DESC", ('day', 'id'), None)]
+        if not (date_from or date_to):
+            # Rows whose date never converted to a day (legacy, non-ISO dates) come
+            # last, as they did under a plain ORDER BY day DESC
+            passes.append(("a.day IS NULL", "a.id DESC", ('id',), None))
+
+    for where, order, key, position in passes:
+        descending = order.endswith("DESC")
+        while True:
+            page_clauses, page_params = [*clauses, where], list(params)
+            if position is not None:
+                columns = ", ".join(f"a.{column}" for column in key)
+                page_clauses.append(f"({columns}) {'<' if descending else '>'} ({', '.join('?' * len(key))})")
+                page_params.extend(position)
+            with get_db_connection() as conn:
+                rows = conn.execute(
+                    f"""
+                    SELECT h.name AS name, a.date, a.category, a.status, a.day, a.id
+                    FROM activities a JOIN habits h ON h.id = a.habit_id
+                    WHERE {' AND '.join(page_clauses)} ORDER BY {order} LIMIT ?
+                    """,
+                    (*page_params, EXPORT_CHUNK_SIZE)
+                ).fetchall()
+            if rows:
+                yield [tuple(row)[:4] for row in rows]
+            if len(rows) < EXPORT_CHUNK_SIZE:
+                break
+            position = tuple(rows[-1][column] for column in key)
+
+def export_data_to_csv(**filters):
+    """Exports activity data as a stream of CSV text chunks, or None if there is nothing to export."""
+    chunks = iter_activity_rows(**filters)
+    first = next(chunks, None)
+    if first is None:
         return None
-    
-    # Use StringIO to build the CSV in memory
-    output = io.StringIO()
-    # CSV Header
-    output.write("Activity,Date,Category,Status\n")
-    
-    for row in logs:
-        output.write(f"{row['name']},{row['date']},{row['category']},{row['status']}\n")
-        
-    output.seek(0)
-    return output
+
+    def generate():
+        # Only one chunk is ever held in memory; the csv module handles quoting
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["Activity", "Date", "Category", "Status"])
+        for rows in chain([first], chunks):
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    return generate()
+
+def export_data_to_ndjson(**filters):
+    """Exports activity data as a stream of newline-delimited JSON, or None if there is nothing to export."""
+    chunks = iter_activity_rows(**filters)
+    first = next(chunks, None)
+    if first is None:
+        return None
+
+    def generate():
+        for rows in chain([first], chunks):
+            yield "".join(json.dumps(dict(zip(EXPORT_FIELDS, row))) + "\n" for row in rows)
+
+    return generate()
+
+def gzip_stream(chunks):
+    """Gzip-compresses a stream of text chunks on the fly."""
+    compressor = zlib.compressobj(wbits=31) # 31 = gzip header and trailer
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_sqlite_snapshot():
+    """Builds a consistent copy of the current user's data as a standalone MindfulMe database.
+
+    The copy is a fresh, fully migrated database holding only this user's habits
+    and activities (owned by its local user), with the derived tables rebuilt.
+    Returns the temporary file's path; the caller removes it once it's sent.
+    """
+    user_id = current_user_id()
+    fd, path = tempfile.mkstemp(prefix='mindfulme_snapshot_', suffix='.db')
+    os.close(fd)
+    try:
+        init_db(path)
+        with closing(sqlite3.connect(path)) as snapshot:
+            with get_db_connection() as conn:
+                # Read both tables in one transaction so they match each other
+                own_transaction = not conn.in_transaction
+                if own_transaction:
+                    conn.execute("BEGIN")
+                try:
+                    snapshot.executemany(
+                        "INSERT INTO habits (id, user_id, name, frequency) VALUES (?, ?, ?, ?)",
+                        ((row['id'], LOCAL_USER_ID, row['name'], row['frequency']) for row in conn.execute(
+                            "SELECT id, name, frequency FROM habits WHERE user_id = ?", (user_id,)
+                        ))
+                    )
+                    snapshot.executemany(
+                        "INSERT INTO activities (id, habit_id, user_id, date, day, category, status) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        ((row['id'], row['habit_id'], LOCAL_USER_ID, *row[2:]) for row in conn.execute(
+                            "SELECT id, habit_id, date, day, category, status FROM activities WHERE user_id = ?",
+                            (user_id,)
+                        ))
+                    )
+                finally:
+                    if own_transaction:
+                        conn.rollback()
+            rebuild_habit_stats(snapshot.cursor())
+            rebuild_habit_days(snapshot.cursor())
+            snapshot.commit()
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+def stream_file(path):
+    """Yields a file's contents SNAPSHOT_BLOCK_SIZE bytes at a time."""
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(SNAPSHOT_BLOCK_SIZE)
+            if not block:
+                break
+            yield block
+
+@cached_report
+def find_missed_habits(days=7):
+    """Returns (habit, date) pairs for every daily habit not logged in the last `days` days.
+
+    Each habit's window is one mask over its completion bitset, instead of one
+    query per habit per day.
+    """
+    habits = fetch_all(
+        "SELECT id, name FROM habits WHERE user_id = ? AND frequency = 'daily' ORDER BY id", (current_user_id(),)
+    )
+    bitsets = completion_bitsets([habit['id'] for habit in habits])
+    today = today_ordinal()
+    return [
+        {"name": habit['name'], "date": ordinal_to_date(day)}
+        for habit in habits
+        for day in bitsets.missing_between(habit['id'], today - days, today - 1)
+    ]
+
+@cached_report
+def habit_heatmap(year, habit=None):
+    """Builds a year's daily completion grid for one habit, or for every habit.
+
+    An unknown habit gets an empty habits list.
+
+    Each habit's year is one masked window of its completion bitset, written out
+    as a string with one character per day from 1 January: '1' logged, '0' not.
+    """
+    start = date(year, 1, 1).toordinal()
+    end = date(year, 12, 31).toordinal()
+    days = end - start + 1
+    if habit:
+        habits = fetch_all("SELECT id, name FROM habits WHERE user_id = ? AND name = ?", (current_user_id(), habit))
+    else:
+        habits = fetch_all(
+            "SELECT id, name FROM habits WHERE user_id = ? AND frequency != 'adhoc' ORDER BY id", (current_user_id(),)
+        )
+    bitsets = completion_bitsets([row['id'] for row in habits])
+    grids = []
+    for row in habits:
+        window = bitsets.window(row['id'], start, end)
+        grids.append({"habit": row['name'], "completed": window.bit_count(), "grid": f"{window:0{days}b}"[::-1]})
+    return {"year": year, "start": ordinal_to_date(start), "days": days, "habits": grids}
+
+def calendar_report(arg):
+    """Chat reply for 'show calendar [habit] [year]': a placeholder the page fills from /api/heatmap."""
+    match = re.fullmatch(r'(?:for\s+)?(?P<habit>.*?)\s*(?P<year>\b\d{4})?', arg or '')
+    name = match['habit'].title() or None
+    year = int(match['year']) if match['year'] else date.today().year
+    habit_id = find_habit_id(name) if name else None
+    if name and (habit_id is None or completion_bitsets([habit_id]).last_day(habit_id) is None):
+        return f"I don't have any logs for '**{name}**' yet. Try '**log {name.lower()}**' first!"
+
+    title = f"**{name}** in {year}" if name else f"**Your habits** in {year}"
+    habit_attr = f' data-habit="{html.escape(name)}"' if name else ''
+    return f"📅 {title}:<br><div class=\"heatmap\" data-year=\"{year}\"{habit_attr}></div>"
+
+def rollup_label(period, bucket):
+    """Human-readable name of a rollup bucket: 2026-10-16, 2026-W42 or 2026-10."""
+    start = date.fromordinal(bucket)
+    if period == 'week':
+        year, week, _ = start.isocalendar()
+        return f"{year}-W{week:02d}"
+    return start.strftime("%Y-%m") if period == 'month' else start.isoformat()
+
+@cached_report
+def rollup_report(period, dimension, key=None, date_from=None, date_to=None):
+    """Returns completion counts per period bucket and per habit or category, from activity_rollups.
+
+    date_from/date_to (YYYY-MM-DD) select the buckets containing those days. The
+    rollups are kept current on write, so this costs O(buckets), not O(activities).
+    """
+    clauses, params = ["user_id = ?", "period = ?", "dimension = ?"], [current_user_id(), period, dimension]
+    if key:
+        clauses.append("key = ?")
+        params.append(key)
+    if date_from:
+        clauses.append(f"bucket >= {DAY_ORDINAL_SQL.format(date=ROLLUP_PERIODS[period].format(date='?'))}")
+        params.append(date_from)
+    if date_to:
+        clauses.append("bucket <= ?")
+        params.append(day_ordinal(date_to))
+    rows = fetch_all(
+        f"SELECT key, bucket, completions FROM activity_rollups WHERE {' AND '.join(clauses)} ORDER BY bucket, key",
+        params
+    )
+    return [
+        {"key": row['key'], "start": ordinal_to_date(row['bucket']),
+         "label": rollup_label(period, row['bucket']), "completions": row['completions']}
+        for row in rows
+    ]
+
+@cached_report
+def missed_habits_report(days=7):
+    """Builds the chat report of missed daily habits for a lookback window."""
+    if days not in MISSED_WINDOWS:
+        return f"I can check the last {', '.join(str(d) for d in MISSED_WINDOWS)} days. Try '**check missed 30 days**'."
+
+    if not fetch_all("SELECT 1 FROM habits WHERE user_id = ? AND frequency = 'daily' LIMIT 1", (current_user_id(),)):
+        return "You haven't set up any daily habits yet. Try adding one with '**add habit [name]**'!"
+
+    missed = find_missed_habits(days)
+    if not missed:
+        period = "week" if days == 7 else f"{days} days"
+        return f"✅ **All Clear!** You haven't missed any of your daily habits in the last {period}!"
+
+    report = f"**Analysis of Missed Daily Habits (Last {days} Days):**<br>"
+    report += "<br>".join(f"- Missed **'{row['name']}'** on {row['date']}." for row in missed)
+    return report
 
 # --- Activity/Habit Management Functions ---
 
-def log_activity(name):
+def resolve_habit_ids(conn, user_id, names):
+    """Maps a user's habit names to ids on a write connection, adding untracked names as 'adhoc' habits."""
+    names = list(dict.fromkeys(names))
+    conn.executemany(
+        "INSERT OR IGNORE INTO habits (user_id, name, frequency) VALUES (?, ?, 'adhoc')",
+        [(user_id, name) for name in names]
+    )
+    ids = {}
+    for start in range(0, len(names), BULK_STATS_CHUNK):
+        chunk = names[start:start + BULK_STATS_CHUNK]
+        rows = conn.execute(
+            f"SELECT name, id FROM habits WHERE user_id = ? AND name IN ({', '.join('?' * len(chunk))})",
+            [user_id, *chunk]
+        )
+        ids.update((row[0], row[1]) for row in rows)
+    return ids
+
+def log_activity(name, report_streak=True):
     """Logs an activity with the current date."""
-    today = datetime.now().strftime("%Y-%m-%d")
+    today = date.today()
+    user_id = ensure_user()
     
-    # Check if already logged today (Prevent duplicates for daily habits)
-    is_duplicate = fetch_all(
-        "SELECT * FROM activities WHERE name = ? AND date = ?",
-        (name, today)
-    )
-    if is_duplicate:
-        return f"Activity '**{name}**' was already logged today. I've noted it, but no duplicate record was created."
+    def insert_log(conn):
+        habit_id = resolve_habit_ids(conn, user_id, [name])[name]
+        # The UNIQUE (habit_id, day) index rejects duplicates for daily habits atomically
+        inserted = conn.execute(
+            "INSERT OR IGNORE INTO activities (habit_id, user_id, date, day, category, status) VALUES (?, ?, ?, ?, ?, ?)",
+            (habit_id, user_id, today.isoformat(), today.toordinal(), 'general', 'completed')
+        ).rowcount
+        if inserted:
+            update_habit_stats(conn, habit_id, today.toordinal())
+            update_habit_days(conn, habit_id, today.toordinal())
+        return inserted
 
-    execute_query(
-        "INSERT INTO activities (name, date, category, status) VALUES (?, ?, ?, ?)",
-        (name, today, 'general', 'completed')
-    )
+    if not run_write(insert_log):
+        return f"Activity '**{name}**' was already logged today. I've noted it, but no duplicate record was created."
     
+    response = f"Activity '**{name}**' logged for today. Well done! 🎉"
+    if not report_streak:
+        return response
+
     # Check streak after logging
     streak = calculate_streak(name)
-    
-    response = f"Activity '**{name}**' logged for today. Well done! 🎉"
     if streak > 1:
         response += f"<br>🔥 **Streak Alert!** Your current streak for {name} is **{streak}** days!"
         
     return response
 
+def validate_activity_record(record, today):
+    """Validates and normalizes one incoming activity record.
+
+    Returns ((name, date, day, category, status), None) or (None, error message).
+    Names are normalized the same way chat 'log' commands are.
+    """
+    if not isinstance(record, dict):
+        return None, "Each record must be an object."
+    name = record.get('name')
+    if not isinstance(name, str) or not name.strip():
+        return None, "name is required."
+    logged_date = record['date'] if 'date' in record else today
+    if not isinstance(logged_date, str) or not is_valid_date(logged_date):
+        return None, "date must be in YYYY-MM-DD format."
+    if logged_date > today:
+        return None, "date can't be in the future."
+    category = record.get('category') or 'general'
+    status = record.get('status') or 'completed'
+    return (name.strip().title(), logged_date, day_ordinal(logged_date), str(category), str(status)), None
+
+def bulk_log_activities(records, update_stats=True):
+    """Validates and inserts many activity records in one transaction.
+
+    Duplicates of an existing log of the same habit on the same day are skipped by INSERT OR IGNORE.
+    Returns one result dict per record, in input order. With update_stats=False
+    the caller must rebuild habit_stats and habit_days for the inserted names itself.
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
+    results = []
+    rows = {}  # (name, date) -> row; keeps the first of any in-batch duplicates
+    for index, record in enumerate(records):
+        row, error = validate_activity_record(record, today)
+        if error:
+            results.append({"index": index, "status": "invalid", "error": error})
+            continue
+        results.append({"index": index, "status": None, "name": row[0], "date": row[1]})
+        rows.setdefault(row[:2], row)
+
+    user_id = ensure_user() if rows else None
+
+    def insert_logs(conn):
+        # run_write holds the write lock for the whole job, so every id above
+        # the current maximum after the insert is one of ours.
+        ids = resolve_habit_ids(conn, user_id, [row[0] for row in rows.values()])
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM activities").fetchone()[0]
+        conn.executemany(
+            "INSERT OR IGNORE INTO activities (habit_id, user_id, date, day, category, status) VALUES (?, ?, ?, ?, ?, ?)",
+            ((ids[name], user_id, *fields) for name, *fields in rows.values())
+        )
+        inserted = {tuple(key) for key in conn.execute(
+            "SELECT h.name, a.date FROM activities a JOIN habits h ON h.id = a.habit_id WHERE a.id > ?", (max_id,)
+        )}
+        if update_stats:
+            rebuild_stats_for(conn, {ids[name] for name, _ in inserted})
+        return inserted
+
+    inserted = run_write(insert_logs) if rows else set()
+    for result in results:
+        if result["status"] is None:
+            key = (result["name"], result["date"])
+            result["status"] = "inserted" if key in inserted else "duplicate"
+            inserted.discard(key)  # later copies of the same key in this batch are duplicates
+    return results
+
+def rebuild_stats_for(conn, habit_ids):
+    """Rebuilds habit_stats and habit_days for a set of habit ids, a bounded number per statement."""
+    habit_ids = sorted(habit_ids)
+    for start in range(0, len(habit_ids), BULK_STATS_CHUNK):
+        rebuild_habit_stats(conn, habit_ids[start:start + BULK_STATS_CHUNK])
+        rebuild_habit_days(conn, habit_ids[start:start + BULK_STATS_CHUNK])
+
+def open_csv_stream(binary):
+    """Wraps a binary stream of plain or gzip-compressed CSV as a text stream."""
+    if not hasattr(binary, 'peek'):
+        binary = io.BufferedReader(binary)
+    if binary.peek(2)[:2] == b'\x1f\x8b': # gzip magic number
+        binary = gzip.GzipFile(fileobj=binary)
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+# What a malformed or truncated upload raises mid-import: bad UTF-8 (a ValueError),
+# bad or cut-off gzip (OSError, EOFError) and bad CSV
+IMPORT_ERRORS = (ValueError, OSError, EOFError, csv.Error)
+
+def import_activities_csv(binary, batch_size=None, progress=None):
+    """Imports activities from a CSV (or gzip CSV) stream, such as a /download_logs export.
+
+    Rows are read one at a time and written batch_size (at most
+    IMPORT_MAX_BATCH_SIZE) at a time, each batch in its own transaction, so memory
+    stays flat however large the file is. progress(summary) is called after every
+    batch. Returns the summary: row counts per status plus the first
+    IMPORT_MAX_REJECTS rejected rows.
+    Raises ValueError if the header lacks Activity/Date columns, and whatever
+    the stream raises if it breaks off (see IMPORT_ERRORS).
+    """
+    batch_size = min(max(batch_size or IMPORT_BATCH_SIZE, 1), IMPORT_MAX_BATCH_SIZE)
+    reader = csv.reader(open_csv_stream(binary))
+    header = next(reader, None) or []
+    columns = {title.strip().lower(): index for index, title in enumerate(header)}
+    fields = {
+        'name': columns.get('activity', columns.get('name')),
+        'date': columns.get('date'),
+        'category': columns.get('category'),
+        'status': columns.get('status'),
+    }
+    if fields['name'] is None or fields['date'] is None:
+        raise ValueError("The CSV needs 'Activity' and 'Date' columns.")
+
+    summary = {"rows": 0, "inserted": 0, "duplicate": 0, "invalid": 0, "rejected": []}
+    touched_names = set()
+    batch, line_numbers = [], []
+
+    def reject(line, error):
+        summary["invalid"] += 1
+        if len(summary["rejected"]) < IMPORT_MAX_REJECTS:
+            summary["rejected"].append({"line": line, "error": error})
+
+    def flush():
+        for result in bulk_log_activities(batch, update_stats=False):
+            if result["status"] == "invalid":
+                reject(line_numbers[result["index"]], result["error"])
+                continue
+            summary[result["status"]] += 1
+            if result["status"] == "inserted":
+                touched_names.add(result["name"])
+        commit_request_transaction()
+        batch.clear()
+        line_numbers.clear()
+        if progress:
+            progress(summary)
+
+    try:
+        for row in reader:
+            if not row:
+                continue
+            summary["rows"] += 1
+            if len(row) <= max(fields['name'], fields['date']):
+                # A missing date would otherwise default to today in validate_activity_record
+                reject(reader.line_num, "date is required; the row ends before the Date column.")
+                continue
+            batch.append({field: row[index] for field, index in fields.items() if index is not None and index < len(row)})
+            line_numbers.append(reader.line_num)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    finally:
+        # Streaks are rebuilt once at the end rather than after every batch, and also
+        # when the stream breaks off, since the batches before that are already committed
+        if touched_names:
+            user_id = current_user_id()
+            run_write(lambda conn: rebuild_stats_for(conn, resolve_habit_ids(conn, user_id, touched_names).values()))
+            commit_request_transaction()
+    return summary
+
 def add_habit(name, frequency="daily"):
     """Adds a new habit to the habits table."""
     # Input Validation: Check if name is too short
     if len(name) < 3:
         return "Habit names should be descriptive. Please use at least 3 characters."
         
-    try:
-        execute_query("INSERT INTO habits (name, frequency) VALUES (?, ?)", (name, frequency))
-        return f"Habit '**{name}**' added with a 'daily' frequency. I'll keep track! 🗓️"
-    except sqlite3.IntegrityError:
+    # A name that was only ever logged is an 'adhoc' habit; adding it starts tracking it
+    user_id = ensure_user()
+    added = run_write(lambda conn: conn.execute(
+        "INSERT INTO habits (user_id, name, frequency) VALUES (?, ?, ?) "
+        "ON CONFLICT (user_id, name) DO UPDATE SET frequency = excluded.frequency WHERE frequency = 'adhoc'",
+        (user_id, name, frequency)
+    ).rowcount)
+    if not added:
         return f"Habit '**{name}**' is already in your list. Try a different name."
+    return f"Habit '**{name}**' added with a 'daily' frequency. I'll keep track! 🗓️"
 
+@cached_report
 def show_detailed_habits():
     """Shows all habits with their current streak."""
-    habits = fetch_all("SELECT name, frequency FROM habits")
+    habits = fetch_all(
+        """
+        SELECT h.name, h.frequency, s.current_streak, s.last_day
+        FROM habits h LEFT JOIN habit_stats s ON s.habit_id = h.id
+        WHERE h.user_id = ? AND h.frequency != 'adhoc'
+        ORDER BY h.id
+        """,
+        (current_user_id(),)
+    )
     if not habits:
         return "You don't have any habits set up yet. Try '**add habit [name]**'."
     
+    today = today_ordinal()
     report = "**Your current tracked habits and progress:**<br>"
     for habit in habits:
         name = habit['name']
-        streak = calculate_streak(name)
+        streak = current_streak(habit['current_streak'], habit['last_day'], today)
         
         report += f"- **{name}** ({habit['frequency']}) | Current Streak: **{streak}** days { '🔥' if streak > 1 else '' }<br>"
     return report
 
 # --- Core Chatbot Logic (Rule-Based NLP) ---
 
+GREETING = ("Hello! I'm **MindfulMe v2.0**, your Advanced Activity Analyzer. I track habits, calculate streaks, "
+            "and validate your data. Type '**help**' for commands or '**export data**' to download your logs.")
+
+HELP_TEXT = ("I'm MindfulMe, here to help you build great habits!<br>"
+             "**Enhanced Commands:**<br>"
+             "1. **Log [activity name]** (e.g., 'log 1 hour of study')<br>"
+             "2. **Add habit [habit name]** (e.g., 'add habit drink 8 glasses of water')<br>"
+             "3. **Show habits** (Shows your habits and **streaks**!)<br>"
+             "4. **Check missed** (Analyzes the last week, or e.g. 'check missed 30 days')<br>"
+             "5. **Export data** (Downloads your full log as a CSV file)<br>"
+             "6. **Show calendar** (A year of completions, e.g. 'show calendar for run 2025')")
+
+# Intent registry, highest priority first. Patterns are anchored on word boundaries
+# (so 'hi' no longer matches inside 'this'); an intent's argument, if any, is
+# captured in a group named '<intent>_arg'.
+INTENTS = [
+    ('export', r'\b(?:export|download\s+data|save\s+logs)'),
+    ('log', r'\blog\s+(?P<log_arg>.+)'),
+    ('add_habit', r'\badd\s+habit\s+(?P<add_habit_arg>.+)'),
+    ('missed', r'\b(?:check\s+missed|analyze|report|show\s+missed)\b(?:\D*?(?P<missed_arg>\d+)\s*days?\b)?'),
+    ('calendar', r'\bshow\s+(?:calendar|heatmap)\b(?:\s+(?P<calendar_arg>.+))?'),
+    ('show_habits', r'\b(?:show\s+habits|what\s+are\s+my\s+habits|show\s+streaks)\b'),
+    ('greeting', r'\b(?:hi|hello|hey)\b'),
+]
+INTENT_PRIORITY = {name: rank for rank, (name, _) in enumerate(INTENTS)}
+# All intents in one alternation; match.lastgroup names the intent that matched
+INTENT_PATTERN = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern in INTENTS))
+
+def classify_intent(text):
+    """Classifies a lowercased message in one regex pass. Returns (intent, argument or None)."""
+    best = None
+    for match in INTENT_PATTERN.finditer(text):
+        if best is None or INTENT_PRIORITY[match.lastgroup] < INTENT_PRIORITY[best.lastgroup]:
+            best = match
+            if INTENT_PRIORITY[best.lastgroup] == 0:
+                break
+    if best is None:
+        return 'help', None
+
+    intent = best.lastgroup
+    arg_group = f'{intent}_arg'
+    arg = best.group(arg_group) if arg_group in INTENT_PATTERN.groupindex else None
+    return intent, arg.strip() if arg else None
+
+INTENT_HANDLERS = {
+    'export': lambda arg: "export_request", # Special code to trigger download route
+    'log': lambda arg: log_activity(arg.title()),
+    'add_habit': lambda arg: add_habit(arg.title()),
+    'missed': lambda arg: missed_habits_report(int(arg) if arg else MISSED_WINDOWS[0]),
+    'calendar': calendar_report,
+    'show_habits': lambda arg: show_detailed_habits(),
+    'greeting': lambda arg: GREETING,
+    'help': lambda arg: HELP_TEXT,
+}
+
+WRITE_INTENTS = ('log', 'add_habit') # Intents that write, so start a session if there is none
+
+# Splits "log run, log read and show habits" into separate commands
+COMMAND_SEPARATOR = re.compile(r'[,;\n]|\bthen\b|\band\b(?=\s+(?:log|add|show|check|export|what)\b)')
+
+def streak_summary(names):
+    """One-line streak alert for several habits, read with a single query."""
+    placeholders = ', '.join('?' * len(names))
+    rows = fetch_all(
+        f"""
+        SELECT h.name, s.current_streak, s.last_day
+        FROM habits h JOIN habit_stats s ON s.habit_id = h.id
+        WHERE h.user_id = ? AND h.name IN ({placeholders})
+        """,
+        [current_user_id(), *names]
+    )
+    today = today_ordinal()
+    streaks = {row['name']: current_streak(row['current_streak'], row['last_day'], today) for row in rows}
+    alerts = [f"{name} **{streaks[name]}** days" for name in dict.fromkeys(names) if streaks.get(name, 0) > 1]
+    return f"🔥 **Streak Alert!** {', '.join(alerts)}" if alerts else None
+
+def run_commands(commands):
+    """Runs several classified commands as one unit of work and combines their replies."""
+    responses, logged = [], []
+    if any(intent in WRITE_INTENTS for intent, _ in commands):
+        ensure_user()
+    with unit_of_work():
+        for intent, arg in commands:
+            if intent == 'log':
+                name = arg.title()
+                responses.append(log_activity(name, report_streak=False))
+                logged.append(name)
+            elif intent == 'export':
+                responses.append("Send '**export data**' on its own to download your logs.")
+            else:
+                responses.append(INTENT_HANDLERS[intent](arg))
+        # Streaks for everything logged above, computed once at the end
+        summary = streak_summary(logged) if logged else None
+    if summary:
+        responses.append(summary)
+    return "<br><br>".join(responses)
+
 def chatbot_response(user_input):
-    """Processes user input and returns a relevant response based on patterns."""
+    """Processes user input and returns a relevant response based on patterns.
+
+    A message holding several commands ("log run, log read, show habits") runs
+    them all in one unit of work, as long as every part is a known command.
+    """
     text = user_input.lower().strip()
+    segments = [segment.strip() for segment in COMMAND_SEPARATOR.split(text) if segment.strip()]
+    if len(segments) > 1:
+        commands = [classify_intent(segment) for segment in segments]
+        if all(intent != 'help' for intent, _ in commands):
+            return run_commands(commands)
 
-    # 1. Export Data Intent
-    if re.search(r'export|download\s+data|save\s+logs', text):
-        return "export_request" # Special code to trigger download route
-
-    # 2. Log Activity Intent 
-    match_log = re.search(r'log\s+(.+)', text)
-    if match_log:
-        activity_name = match_log.group(1).strip().title()
-        return log_activity(activity_name)
-
-    # 3. Add Habit Intent 
-    match_add_habit = re.search(r'add\s+habit\s+(.+)', text)
-    if match_add_habit:
-        habit_name = match_add_habit.group(1).strip().title()
-        return add_habit(habit_name) 
-
-    # 4. Check Missed Activities Intent (reusing function from previous version)
-    if re.search(r'check\s+missed|analyze|report|show\s+missed', text):
-        # NOTE: Using the check_missed_activities from the previous response is fine here
-        # For simplicity, we'll keep the logic inline here to avoid circular imports if this was split
-        habits = fetch_all("SELECT name FROM habits WHERE frequency = 'daily'")
-        if not habits:
-            return "You haven't set up any daily habits yet. Try adding one with '**add habit [name]**'!"
-        
-        missed_report = "**Analysis of Missed Daily Habits (Last 7 Days):**\n"
-        missed_count = 0
-        today = datetime.now().date()
-        
-        for habit in habits:
-            habit_name = habit['name']
-            for i in range(1, 8):
-                check_date = today - timedelta(days=i)
-                date_str = check_date.strftime("%Y-%m-%d")
-                log = fetch_all("SELECT * FROM activities WHERE name = ? AND date = ?", (habit_name, date_str))
-                if not log:
-                    missed_report += f"- Missed **'{habit_name}'** on {date_str}.\n"
-                    missed_count += 1
-                    
-        if missed_count == 0:
-            return "✅ **All Clear!** You haven't missed any of your daily habits in the last week!"
-        else:
-            return missed_report.strip('\n').replace('\n', '<br>')
-
-    # 5. Show Detailed Habits Intent
-    if re.search(r'show\s+habits|what\s+are\s+my\s+habits|show\s+streaks', text):
-        return show_detailed_habits()
-
-    # 6. Greeting/Simple Chit-Chat
-    if re.search(r'hi|hello|hey', text):
-        return "Hello! I'm **MindfulMe v2.0**, your Advanced Activity Analyzer. I track habits, calculate streaks, and validate your data. Type '**help**' for commands or '**export data**' to download your logs."
-    
-    # 7. Help/Unknown Intent (Default)
-    return ("I'm MindfulMe, here to help you build great habits!<br>"
-            "**Enhanced Commands:**<br>"
-            "1. **Log [activity name]** (e.g., 'log 1 hour of study')<br>"
-            "2. **Add habit [habit name]** (e.g., 'add habit drink 8 glasses of water')<br>"
-            "3. **Show habits** (Shows your habits and **streaks**!)<br>"
-            "4. **Check missed** (Analyzes the last week)<br>"
-            "5. **Export data** (Downloads your full log as a CSV file)")
+    intent, arg = classify_intent(text)
+    return INTENT_HANDLERS[intent](arg)
 
 # --- Flask Routes ---
 
+@app.before_request
+def load_user():
+    """Sets g.user_id from the session token in the SESSION_HEADER header or the session cookie.
+
+    Without a token the request has no user until its first write (see ensure_user).
+    A header token that matches no session is refused rather than silently
+    replaced by a new, empty user.
+    """
+    if request.endpoint is None or request.endpoint in PUBLIC_ENDPOINTS:
+        return
+    token = request.headers.get(SESSION_HEADER)
+    if token:
+        g.user_id = find_session_user(token)
+        if g.user_id is None:
+            return jsonify({"error": f"Unknown {SESSION_HEADER} token."}), 401
+        return
+    token = request.cookies.get(SESSION_COOKIE)
+    if token:
+        user_id = find_session_user(token)
+        if user_id is not None:
+            g.user_id = user_id
+
+@app.after_request
+def set_session_cookie(response):
+    """Hands a newly started session's token to the browser (as a cookie) and to API clients (as a header)."""
+    token = g.pop('new_session_token', None)
+    if token:
+        response.set_cookie(SESSION_COOKIE, token, max_age=SESSION_MAX_AGE, httponly=True, samesite='Lax')
+        response.headers[SESSION_HEADER] = token
+    return response
+
+@app.after_request
+def commit_db(response):
+    """Commits the request's transaction, turning a failed commit into an error response.
+
+    Runs before set_session_cookie (Flask calls after_request hooks in reverse),
+    so a session whose user wasn't saved never reaches the browser.
+    Error responses (5xx) are left for teardown_db to roll back.
+    """
+    conn = g.get('db_conn')
+    if conn is None or not conn.in_transaction or response.status_code >= 500:
+        return response
+    g.pop('uow_conn', None)
+    try:
+        conn.commit()
+    except sqlite3.Error as error:
+        conn.rollback()
+        g.pop('new_session_token', None)
+        app.logger.error("Commit failed: %s", error)
+        return make_response(jsonify({"error": "Couldn't save changes.", "response": "Sorry, I couldn't save that. Please try again."}), 503)
+    return response
+
+@app.teardown_request
+def teardown_db(error=None):
+    """Returns the request's connection, rolling back anything left uncommitted."""
+    release_request_connection()
+
+@app.route("/api/session", methods=["POST"])
+def api_session():
+    """Signs this browser in as the user of the X-MindfulMe-Token header's token by setting the session cookie."""
+    token = request.headers.get(SESSION_HEADER)
+    if not token:
+        return jsonify({"error": f"Send the token in the {SESSION_HEADER} header."}), 400
+    response = jsonify({"user_id": current_user_id()})
+    response.set_cookie(SESSION_COOKIE, token, max_age=SESSION_MAX_AGE, httponly=True, samesite='Lax')
+    return response
+
 @app.route("/")
 def index():
     """Renders the main chat interface page."""
@@ -244,18 +1157,217 @@ def get_bot_response():
 
 @app.route("/download_logs")
 def download_logs():
-    """Handles the actual CSV file download."""
-    csv_data = export_data_to_csv()
-    
-    if csv_data is None:
-        return "No data to export.", 404
-    
-    return send_file(
-        csv_data,
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'MindfulMe_Logs_{datetime.now().strftime("%Y%m%d")}.csv'
-    )
+    """Streams the log download.
+
+    ?format= is one of EXPORT_FORMATS (default csv). CSV and NDJSON exports can be
+    filtered by ?from=&to= (YYYY-MM-DD) and ?habit=; 'sqlite' is a full snapshot of the user's data.
+    ?since=<cursor> makes a delta export of rows added after that cursor; the
+    cursor to pass next time comes back in the X-MindfulMe-Cursor header.
+    """
+    fmt = request.args.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return f"Unknown format. Use one of: {', '.join(EXPORT_FORMATS)}.", 400
+
+    date_from = request.args.get("from")
+    date_to = request.args.get("to")
+    habit = request.args.get("habit")
+    for value in (date_from, date_to):
+        if value and not is_valid_date(value):
+            return "Dates must be in YYYY-MM-DD format.", 400
+
+    since = request.args.get("since")
+    headers = {}
+    on_close = None
+    if since is not None:
+        if not since.isdigit():
+            return "The since cursor must be a non-negative integer.", 400
+        since = int(since)
+        # Ids only ever grow (AUTOINCREMENT), so the user's current max id is the new high-water
+        # mark: their later rows all get higher ids. Capping the export at it keeps rows
+        # inserted mid-stream for the next sync, and other users' writes never move it.
+        high_water = fetch_all(
+            "SELECT COALESCE(MAX(id), 0) AS max_id FROM activities WHERE user_id = ?", (current_user_id(),)
+        )[0]['max_id']
+        headers["X-MindfulMe-Cursor"] = str(max(high_water, since))
+
+    if fmt == 'sqlite':
+        if date_from or date_to or habit or since is not None:
+            return "Filters aren't supported for SQLite snapshots.", 400
+        path = export_sqlite_snapshot()
+        # Removed when the response closes: after it's sent, or if it never is (HEAD, a dropped client)
+        on_close = lambda: os.remove(path)
+        stream = stream_file(path)
+    else:
+        export = export_data_to_ndjson if fmt == 'ndjson' else export_data_to_csv
+        filters = {"date_from": date_from, "date_to": date_to, "habit": habit}
+        if since is not None:
+            filters.update(since=since, until=high_water)
+        stream = export(**filters)
+        if stream is None:
+            if since is not None:
+                return Response(status=204, headers=headers)
+            return "No data to export.", 404
+        if fmt == 'csv.gz':
+            stream = gzip_stream(stream)
+
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    filename = f'MindfulMe_Logs_{datetime.now().strftime("%Y%m%d")}.{extension}'
+    headers["Content-Disposition"] = f"attachment; filename={filename}"
+    # Keep the request (and its connection) alive until the stream is fully sent
+    response = Response(stream_with_context(stream), mimetype=mimetype, headers=headers)
+    if on_close:
+        response.call_on_close(on_close)
+    return response
+
+@app.route("/api/missed")
+def api_missed():
+    """Returns missed daily habits as JSON, e.g. /api/missed?days=30."""
+    days = request.args.get("days", MISSED_WINDOWS[0], type=int)
+    if days not in MISSED_WINDOWS:
+        return jsonify({"error": f"days must be one of {list(MISSED_WINDOWS)}"}), 400
+
+    missed = [{"habit": row['name'], "date": row['date']} for row in find_missed_habits(days)]
+    return jsonify({"days": days, "count": len(missed), "missed": missed})
+
+@app.route("/api/activities/bulk", methods=["POST"])
+def api_bulk_activities():
+    """Inserts a JSON list of {name, date, category, status} records (or {"activities": [...]})."""
+    payload = request.get_json(silent=True)
+    records = payload.get("activities") if isinstance(payload, dict) else payload
+    if not isinstance(records, list):
+        return jsonify({"error": "Expected a JSON list of activity records."}), 400
+    if len(records) > BULK_MAX_RECORDS:
+        return jsonify({"error": f"At most {BULK_MAX_RECORDS} records per request."}), 413
+
+    results = bulk_log_activities(records)
+    summary = {status: sum(1 for r in results if r["status"] == status) for status in ("inserted", "duplicate", "invalid")}
+    return jsonify({**summary, "results": results})
+
+@app.route("/api/activities/import", methods=["POST"])
+def api_import_activities():
+    """Imports a CSV or gzip CSV, uploaded as the 'file' form field or sent as the raw body."""
+    upload = request.files.get("file")
+    stream = upload.stream if upload else request.stream
+    batch_size = request.args.get("batch_size", type=int)
+    try:
+        summary = import_activities_csv(stream, batch_size=batch_size)
+    except IMPORT_ERRORS as error:
+        return jsonify({"error": f"Couldn't import the file: {error}"}), 400
+    return jsonify(summary)
+
+@app.route("/api/heatmap")
+def api_heatmap():
+    """Returns a year of daily completions as JSON, e.g. /api/heatmap?habit=run&year=2025.
+
+    Without ?habit= every habit is included; ?year= defaults to this year. An
+    unknown habit is a 404.
+    """
+    year = request.args.get("year", date.today().year, type=int)
+    if not 1 <= year <= 9999:
+        return jsonify({"error": "year must be between 1 and 9999"}), 400
+    habit = request.args.get("habit")
+    habit = habit.strip().title() if habit else None
+    heatmap = habit_heatmap(year, habit)
+    if habit and not heatmap["habits"]:
+        return jsonify({"error": f"No habit called '{habit}'"}), 404
+    return jsonify(heatmap)
+
+@app.route("/api/rollups")
+def api_rollups():
+    """Returns completion counts per day, week or month, e.g. /api/rollups?period=week&by=habit&key=run.
+
+    ?period= is day, week (ISO, the default) or month; ?by= is habit (default) or
+    category; ?key= picks one habit or category and ?from=&to= (YYYY-MM-DD) a range.
+    """
+    period = request.args.get("period", "week")
+    dimension = request.args.get("by", "habit")
+    if period not in ROLLUP_PERIODS:
+        return jsonify({"error": f"period must be one of {list(ROLLUP_PERIODS)}"}), 400
+    if dimension not in ROLLUP_DIMENSIONS:
+        return jsonify({"error": f"by must be one of {list(ROLLUP_DIMENSIONS)}"}), 400
+
+    date_from = request.args.get("from")
+    date_to = request.args.get("to")
+    for value in (date_from, date_to):
+        if value and not is_valid_date(value):
+            return jsonify({"error": "Dates must be in YYYY-MM-DD format."}), 400
+    key = request.args.get("key")
+    if key and dimension == 'habit':
+        key = key.strip().title()
+    return jsonify({"period": period, "by": dimension,
+                    "rollups": rollup_report(period, dimension, key, date_from, date_to)})
+
+@app.route("/api/streaks")
+def api_streaks():
+    """Returns current and longest streaks for every habit as JSON."""
+    return jsonify({"streaks": compute_all_streaks()})
+
+@app.route("/api/db_stats")
+def db_stats():
+    """Returns connection pool, writer queue, report cache and completion bitset metrics for monitoring.
+
+    In 'sharded' mode the cache and completion figures are totals over the
+    shards whose caches are kept in memory (their versions are per shard, so left out).
+    """
+    stats = {"storage_mode": STORAGE_MODE, "pool": db_pool.stats()}
+    if db_shards is None:
+        stats.update(cache=report_cache.stats(), completion=completion_index.stats())
+    else:
+        caches = shard_caches.values()
+        stats["cache"] = total_stats(cache.stats() for cache, _ in caches)
+        stats["completion"] = total_stats(index.stats() for _, index in caches)
+        stats["shards"] = {**db_shards.stats(), "cached": len(caches)}
+    if db_writer is not None:
+        stats["writer"] = db_writer.stats()
+    return jsonify(stats)
+
+def total_stats(snapshots):
+    """Sums the counters of several stats() snapshots, skipping their versions."""
+    totals = {}
+    for snapshot in snapshots:
+        for name, value in snapshot.items():
+            if name != "version":
+                totals[name] = totals.get(name, 0) + value
+    return totals
+
+# --- CLI Commands (flask --app app <command>) ---
+
+@app.cli.command("issue-token")
+@click.option("--user", "user_id", type=int, default=LOCAL_USER_ID, show_default=True, help="User id to issue a token for.")
+def issue_token_command(user_id):
+    """Issues a new session token for a user and prints it.
+
+    This is how the local user (owner of the data from before sessions) is claimed.
+    Send the token in the X-MindfulMe-Token header, or POST it that way to
+    /api/session to sign a browser in.
+    """
+    if not fetch_directory("SELECT 1 FROM users WHERE id = ?", (user_id,)):
+        raise click.ClickException(f"There is no user {user_id}.")
+    token = secrets.token_urlsafe(32)
+    run_directory_write(lambda conn: issue_token(conn, user_id, hash_token(token)))
+    click.echo(token)
+
+@app.cli.command("import-csv")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--batch-size", type=int, default=None, help="Rows per transaction.")
+@click.option("--user", "user_id", type=int, default=LOCAL_USER_ID, show_default=True, help="User id to import for.")
+def import_csv_command(path, batch_size, user_id):
+    """Imports activities from a CSV or gzip CSV file (e.g. a /download_logs export) for one user."""
+    def report(summary):
+        click.echo(f"\r{summary['rows']} rows read, {summary['inserted']} inserted, "
+                   f"{summary['duplicate']} duplicates, {summary['invalid']} rejected", nl=False)
+
+    if not fetch_directory("SELECT 1 FROM users WHERE id = ?", (user_id,)):
+        raise click.ClickException(f"There is no user {user_id}.")
+    with open(path, 'rb') as f, acting_as(user_id):
+        try:
+            summary = import_activities_csv(f, batch_size=batch_size, progress=report)
+        except IMPORT_ERRORS as error:
+            click.echo()  # end the progress line
+            raise click.ClickException(f"Couldn't import the file: {error}")
+    click.echo()
+    for reject in summary["rejected"]:
+        click.echo(f"  line {reject['line']}: {reject['error']}")
 
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
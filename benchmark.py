@@ -0,0 +1,541 @@
+# benchmark.py
+import argparse
+import atexit
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import random
+import re
+import secrets
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+# Work in a scratch directory so importing app never touches the real mindfulme.db
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKDIR = tempfile.mkdtemp(prefix='mindfulme_bench_')
+atexit.register(shutil.rmtree, WORKDIR, ignore_errors=True)
+sys.path.insert(0, REPO_DIR)
+os.chdir(WORKDIR)
+
+import app
+from activity_db import (init_db, update_habit_stats, update_habit_days, rebuild_stats, generate_data,
+                         STREAKS_SQL, FIXTURES)
+from storage import ConnectionPool, ShardedPool, ShardLocal, CompletionIndex, VersionedCache
+
+# --- Fixtures ---
+
+def build_database(path, habits, days, adherence=0.7, seed=42, users=1):
+    """Creates a database of `users` users, each with `habits` daily habits and up to `days` days of logs for each.
+
+    User 1 (the local user) is the one every benchmark reads as.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    init_db(path)
+    rng = random.Random(seed)
+    today = datetime.now().date()
+    names = [f"Habit {i}" for i in range(habits)]
+
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO users (id, created_at) VALUES (?, datetime('now'))",
+                     [(user_id,) for user_id in range(2, users + 1)])
+    conn.executemany("INSERT INTO habits (user_id, name, frequency) VALUES (?, ?, 'daily')",
+                     [(user_id, name) for user_id in range(1, users + 1) for name in names])
+    habits = conn.execute("SELECT id, user_id FROM habits ORDER BY id").fetchall()
+    conn.executemany(
+        "INSERT INTO activities (habit_id, user_id, date, day, category, status) "
+        "VALUES (?, ?, ?, ?, 'general', 'completed')",
+        ((habit_id, user_id, (today - timedelta(days=d)).strftime("%Y-%m-%d"), today.toordinal() - d)
+         for habit_id, user_id in habits for d in range(days) if rng.random() < adherence)
+    )
+    conn.commit()
+    conn.close()
+    rebuild_stats(path)
+
+def use_database(path):
+    """Points app's database helpers at another database file (migrating it if it's from an older schema)."""
+    init_db(path)
+    app.DATABASE = path
+    app.db_pool = ConnectionPool(path, size=app.POOL_SIZE)
+    app.db_shards = None
+    app.completion_index = CompletionIndex()
+
+def use_shards(directory, max_open):
+    """Switches app to 'sharded' mode, with per-user databases under `directory`."""
+    os.makedirs(directory, exist_ok=True)
+    app.SHARD_DIR = directory
+    app.db_shards = ShardedPool(app.shard_path, max_open=max_open, pragmas=app.WAL_PRAGMAS, prepare=app.prepare_shard)
+    app.shard_caches = ShardLocal(lambda: (VersionedCache(max_entries=app.CACHE_SIZE), CompletionIndex()))
+
+def local_client():
+    """Returns a Flask test client signed in as the local user through the session header."""
+    token = secrets.token_urlsafe(32)
+    app.run_directory_write(lambda conn: app.issue_token(conn, app.LOCAL_USER_ID, app.hash_token(token)))
+    client = app.app.test_client()
+    client.environ_base[f"HTTP_{app.SESSION_HEADER.upper().replace('-', '_')}"] = token
+    return client
+
+def timed(fn, repeat=5):
+    """Returns the best wall time of `repeat` calls to fn, in milliseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+# --- Benchmarks ---
+
+def legacy_missed(days):
+    """The original missed-habits loop: one query per habit per day."""
+    today = datetime.now().date()
+    missed = []
+    for habit in app.fetch_all("SELECT id, name FROM habits WHERE frequency = 'daily'"):
+        for i in range(1, days + 1):
+            day = today - timedelta(days=i)
+            # (habit_id, day) is the per-habit-per-day index the original (name, date) lookup had
+            if not app.fetch_all("SELECT * FROM activities a WHERE a.habit_id = ? AND a.day = ?",
+                                 (habit['id'], day.toordinal())):
+                missed.append((habit['name'], day.strftime("%Y-%m-%d")))
+    return missed
+
+def bench_missed():
+    """find_missed_habits for each lookback window as the number of habits grows."""
+    for habits in (10, 50, 200):
+        path = os.path.join(WORKDIR, f'missed_{habits}.db')
+        build_database(path, habits, days=365)
+        use_database(path)
+        for days in app.MISSED_WINDOWS:
+            ms = timed(lambda: app.find_missed_habits.__wrapped__(days)) # bypass the report cache
+            legacy_ms = timed(lambda: legacy_missed(days), repeat=1)
+            print(f"missed   habits={habits:<5} days={days:<4} {ms:9.2f} ms   (per-day loop {legacy_ms:9.2f} ms)")
+
+def legacy_calculate_streak(habit_name):
+    """The original calculate_streak: load every logged date, parse it, walk back day by day."""
+    logs = app.fetch_all("SELECT a.date FROM activities a JOIN habits h ON h.id = a.habit_id "
+                         "WHERE h.name = ? ORDER BY a.date DESC", (habit_name,))
+    today = datetime.now().date()
+    logged_dates = {datetime.strptime(row['date'], "%Y-%m-%d").date() for row in logs}
+    streak = 1 if today in logged_dates else 0
+    check_date = today - timedelta(days=1)
+    while check_date in logged_dates:
+        streak += 1
+        check_date -= timedelta(days=1)
+    return streak
+
+def legacy_window_streaks():
+    """All-habits streaks in one gaps-and-islands window query over activities."""
+    return app.fetch_all(f"""
+        SELECT h.name, s.last_run, s.longest_streak, s.last_day
+        FROM habits h
+        LEFT JOIN ({STREAKS_SQL.format(where='')}) s ON s.habit_id = h.id
+    """)
+
+def cold_bitsets():
+    """Loads every habit_days row into a fresh completion index, as a new worker would."""
+    app.completion_index = CompletionIndex()
+    return app.completion_bitsets()
+
+def cold_cache():
+    """Swaps in an empty report cache so the next report is computed, not served from memory."""
+    app.report_cache = VersionedCache(max_entries=app.CACHE_SIZE)
+
+def bench_streaks(habits=1000, days=1430):
+    """All-habits streaks on ~1M activity rows: per-habit loop vs window query vs bitsets vs habit_stats."""
+    path = os.path.join(WORKDIR, 'streaks.db')
+    build_database(path, habits, days)
+    use_database(path)
+    rows = app.fetch_all("SELECT COUNT(*) AS n FROM activities")[0]['n']
+    names = [row['name'] for row in app.fetch_all("SELECT name FROM habits")]
+
+    legacy_ms = timed(lambda: [legacy_calculate_streak(name) for name in names], repeat=1)
+    window_ms = timed(legacy_window_streaks, repeat=3)
+    load_ms = timed(cold_bitsets, repeat=1)
+    bitset_ms = timed(app.compute_all_streaks.__wrapped__, repeat=3) # bypass the report cache
+    stats_ms = timed(app.show_detailed_habits.__wrapped__, repeat=3)
+    completion = app.completion_index.stats()
+    print(f"streaks  rows={rows:<8} per-habit loop {legacy_ms:9.2f} ms")
+    print(f"streaks  rows={rows:<8} window query   {window_ms:9.2f} ms")
+    print(f"streaks  rows={rows:<8} bitsets        {bitset_ms:9.2f} ms   (loading habit_days {load_ms:.2f} ms,"
+          f" {completion['bytes'] / completion['habits'] / (days / 365):.1f} bytes per habit-year)")
+    print(f"streaks  rows={rows:<8} habit_stats    {stats_ms:9.2f} ms")
+
+def legacy_weekly_counts(date_from=None, habit=None):
+    """Weekly completions per habit the old way: a GROUP BY over the matching activity rows."""
+    clauses, params = ["1"], []
+    if date_from:
+        clauses.append("a.date >= date(?, 'weekday 0', '-6 days')")
+        params.append(date_from)
+    if habit:
+        clauses.append("h.name = ?")
+        params.append(habit)
+    return app.fetch_all(f"""
+        SELECT h.name, date(a.date, 'weekday 0', '-6 days') AS week, COUNT(*) AS completions
+        FROM activities a JOIN habits h ON h.id = a.habit_id
+        WHERE {' AND '.join(clauses)} GROUP BY h.name, week ORDER BY week, h.name
+    """, params)
+
+def bench_rollups(habits=200, days=1430):
+    """Weekly completions per habit, as a dashboard asks for them: activity scan vs activity_rollups."""
+    path = os.path.join(WORKDIR, 'rollups.db')
+    build_database(path, habits, days)
+    use_database(path)
+    rows = app.fetch_all("SELECT COUNT(*) AS n FROM activities")[0]['n']
+    recent = (datetime.now().date() - timedelta(weeks=12)).isoformat()
+    cases = [
+        ("every habit, last 12 weeks", {"date_from": recent}),
+        ("one habit, all history", {"habit": "Habit 7"}),
+        ("every habit, all history", {}),
+    ]
+    for label, filters in cases:
+        scan_ms = timed(lambda: legacy_weekly_counts(**filters), repeat=3)
+        rollup_ms = timed(lambda: app.rollup_report.__wrapped__(  # bypass the report cache
+            'week', 'habit', filters.get("habit"), filters.get("date_from")), repeat=3)
+        print(f"rollups  rows={rows:<8} weekly, {label:<27} scan {scan_ms:8.2f} ms   rollups {rollup_ms:8.2f} ms")
+
+def bench_users(users=10000, habits=3, days=20):
+    """Per-user reads for one user, alone in the database vs. sharing it with `users` users."""
+    timings = {}
+    for count in (1, users):
+        path = os.path.join(WORKDIR, f'users_{count}.db')
+        build_database(path, habits, days, users=count)
+        use_database(path)
+        cold_bitsets()
+        timings[count] = {
+            "show habits": timed(app.show_detailed_habits.__wrapped__),
+            "streak": timed(lambda: app.calculate_streak.__wrapped__('Habit 0')),
+            "missed 30": timed(lambda: app.find_missed_habits.__wrapped__(30)),
+            "weekly rollups": timed(lambda: app.rollup_report.__wrapped__('week', 'habit')),
+            "export": timed(lambda: sum(len(rows) for rows in app.iter_activity_rows())),
+            "delta export": timed(lambda: sum(len(rows) for rows in app.iter_activity_rows(since=0, until=2 ** 62))),
+        }
+    for label, ms in timings[1].items():
+        print(f"users    {label:<15} 1 user {ms:7.3f} ms   {users} users {timings[users][label]:7.3f} ms")
+
+def _hold_write_lock(user_id, seconds, locked):
+    """A heavy user's backfill: one write transaction kept open for `seconds`."""
+    with app.acting_as(user_id), app.unit_of_work():
+        locked.set()
+        time.sleep(seconds)
+
+def bench_shards(users=200, max_open=16, hold=0.5):
+    """Shared database vs per-user shards: a write while another user holds the write lock, and LRU reuse."""
+    blocked = {}
+    for mode in ('shared', 'sharded'):
+        build_database(os.path.join(WORKDIR, f'{mode}.db'), habits=1, days=0, users=users)
+        use_database(os.path.join(WORKDIR, f'{mode}.db'))
+        if mode == 'sharded':
+            use_shards(os.path.join(WORKDIR, 'shards'), max_open)
+        with app.acting_as(3):
+            app.data_version()  # open (in 'sharded' mode, create) user 3's database before timing
+        locked = threading.Event()
+        holder = threading.Thread(target=_hold_write_lock, args=(2, hold, locked))
+        holder.start()
+        locked.wait()
+        started = time.perf_counter()
+        with app.acting_as(3):
+            app.log_activity('Habit 0', report_streak=False)
+        blocked[mode] = (time.perf_counter() - started) * 1000
+        holder.join()
+    print(f"shards   write while another user holds the lock {hold * 1000:.0f} ms:"
+          f" shared {blocked['shared']:7.2f} ms   sharded {blocked['sharded']:7.2f} ms")
+
+    def cycle(count):
+        for user_id in range(1, count + 1):
+            with app.acting_as(user_id):
+                app.show_detailed_habits.__wrapped__()
+
+    warm = max_open // 2
+    warm_ms = timed(lambda: cycle(warm)) / warm
+    churn_ms = timed(lambda: cycle(users)) / users
+    print(f"shards   show habits per user: {warm} users {warm_ms:.3f} ms   {users} users through {max_open}"
+          f" connections {churn_ms:.3f} ms   ({app.db_shards.stats()['evicted']} evictions)")
+
+HEATMAP_BUDGET_MS = 20 # Target for a full-year heatmap of 100 habits with 5 years of history
+
+def bench_heatmap(habits=100, years=5):
+    """A year's heatmap for every habit, straight from the bitsets and through /api/heatmap."""
+    path = os.path.join(WORKDIR, 'heatmap.db')
+    build_database(path, habits, days=365 * years)
+    use_database(path)
+    year = datetime.now().year - 1
+    cold_bitsets()
+
+    heatmap_ms = timed(lambda: app.habit_heatmap.__wrapped__(year)) # bypass the report cache
+    client = local_client()
+    route_ms = timed(lambda: (cold_cache(), client.get(f'/api/heatmap?year={year}')))
+    print(f"heatmap  habits={habits:<4} years={years:<3} {heatmap_ms:7.2f} ms   (/api/heatmap {route_ms:.2f} ms,"
+          f" budget {HEATMAP_BUDGET_MS} ms)")
+    if route_ms > HEATMAP_BUDGET_MS:
+        sys.exit(1)
+
+# (message, expected intent) pairs; bench_intents checks these before timing anything
+INTENT_CORPUS = [
+    ("hello", 'greeting'),
+    ("hey there!", 'greeting'),
+    ("this is great", 'help'),
+    ("they said hi", 'greeting'),
+    ("what can you do?", 'help'),
+    ("log 1 hour of study", 'log'),
+    ("please log meditation", 'log'),
+    ("hello, log run", 'log'),
+    ("catalog my books", 'help'),
+    ("add habit drink 8 glasses of water", 'add_habit'),
+    ("check missed", 'missed'),
+    ("check missed 30 days", 'missed'),
+    ("give me a report", 'missed'),
+    ("show missed habits", 'missed'),
+    ("show habits", 'show_habits'),
+    ("show calendar", 'calendar'),
+    ("show calendar for run 2025", 'calendar'),
+    ("what are my habits", 'show_habits'),
+    ("show streaks", 'show_habits'),
+    ("export data", 'export'),
+    ("download data please", 'export'),
+    ("save logs", 'export'),
+    ("please export my data and show habits", 'export'),
+]
+
+def legacy_classify(text):
+    """The original classifier: up to seven re.search calls in sequence."""
+    if re.search(r'export|download\s+data|save\s+logs', text):
+        return 'export'
+    if re.search(r'log\s+(.+)', text):
+        return 'log'
+    if re.search(r'add\s+habit\s+(.+)', text):
+        return 'add_habit'
+    if re.search(r'check\s+missed|analyze|report|show\s+missed', text):
+        re.search(r'(\d+)\s*days?', text)
+        return 'missed'
+    if re.search(r'show\s+habits|what\s+are\s+my\s+habits|show\s+streaks', text):
+        return 'show_habits'
+    if re.search(r'hi|hello|hey', text):
+        return 'greeting'
+    return 'help'
+
+def bench_intents(rounds=2000):
+    """classify_intent over INTENT_CORPUS, after checking every classification."""
+    wrong = [(message, expected, app.classify_intent(message)[0])
+             for message, expected in INTENT_CORPUS if app.classify_intent(message)[0] != expected]
+    for message, expected, got in wrong:
+        print(f"intents  MISCLASSIFIED {message!r}: expected {expected}, got {got}")
+    if wrong:
+        sys.exit(1)
+
+    messages = [message for message, _ in INTENT_CORPUS] * rounds
+    router_ms = timed(lambda: [app.classify_intent(message) for message in messages])
+    legacy_ms = timed(lambda: [legacy_classify(message) for message in messages])
+    per_message = 1000 / len(messages)
+    print(f"intents  messages={len(messages):<7} router {router_ms * per_message:6.2f} us/msg"
+          f"   (sequential re.search {legacy_ms * per_message:6.2f} us/msg)")
+
+def _coherence_reader(path, pipe):
+    """Worker process for bench_cache_coherence: answers each request with a cached streak read."""
+    use_database(path)
+    while True:
+        habit = pipe.recv()
+        if habit is None:
+            break
+        started = time.perf_counter()
+        streak = app.calculate_streak(habit)
+        pipe.send((streak, (time.perf_counter() - started) * 1000))
+
+def bench_cache_coherence(rounds=200):
+    """Proves a worker's cached streaks never go stale when another process writes."""
+    path = os.path.join(WORKDIR, 'coherence.db')
+    build_database(path, habits=1, days=0)
+    today = datetime.now().date()
+
+    context = multiprocessing.get_context('spawn')
+    parent, child = context.Pipe()
+    reader = context.Process(target=_coherence_reader, args=(path, child))
+    reader.start()
+
+    stale = 0
+    hit_ms = []
+    writer = sqlite3.connect(path)
+    habit_id = writer.execute("SELECT id FROM habits WHERE name = 'Habit 0'").fetchone()[0]
+    try:
+        for expected in range(1, rounds + 1):
+            # Another "worker" extends the streak by one day, backwards from today
+            day = today - timedelta(days=expected - 1)
+            with writer:
+                writer.execute("INSERT INTO activities (habit_id, date, day) VALUES (?, ?, ?)",
+                               (habit_id, day.isoformat(), day.toordinal()))
+                update_habit_stats(writer, habit_id, day.toordinal())
+                update_habit_days(writer, habit_id, day.toordinal())
+            for _ in range(2):  # the first read repopulates the cache, the second is a hit
+                parent.send('Habit 0')
+                streak, ms = parent.recv()
+                stale += streak != expected
+            hit_ms.append(ms)
+    finally:
+        parent.send(None)
+        reader.join()
+        writer.close()
+
+    hit_ms.sort()
+    print(f"cache    rounds={rounds:<5} stale reads={stale}   cached read p50 {hit_ms[len(hit_ms) // 2]:.3f} ms")
+    if stale:
+        sys.exit(1)
+
+# --- Hot Path Suite ---
+# Times the request-facing hot paths on generated databases of growing size and
+# checks them against a JSON baseline: record one with --save-baseline, and later
+# runs fail when any path got more than --threshold percent slower. Baselines are
+# scaled by a fixed pure-Python workload timed alongside the paths, so a slower
+# machine (or a slow CPU this time around) doesn't read as a regression.
+
+SUITE_SIZES = ('10k', '1m') # Default activity_db FIXTURES to run on; --sizes 10k,1m,10m adds the largest
+SUITE_SEED = 0 # Seed for every generated fixture
+SUITE_BASELINE = os.path.join(REPO_DIR, 'benchmark_baseline.json')
+SUITE_THRESHOLD = 50.0 # Percent slower than the baseline that counts as a regression (sub-ms paths jitter ~25%)
+SUITE_NOISE_MS = 0.05 # Slowdowns smaller than this are timer noise, never regressions
+SUITE_REPEAT = 30 # Interleaved rounds per fixture; each path's best round counts
+SUITE_CALIBRATION = "calibration" # Result key of the fixed workload baselines are scaled by
+# Generated fixtures are kept here between runs when set; otherwise they're made fresh each run
+SUITE_FIXTURE_DIR = os.environ.get('MINDFULME_BENCH_FIXTURES', WORKDIR)
+
+# intent -> message timed through chatbot_response (generated users all have a 'Run' habit).
+# {n} is a fresh number per call, so writes never hit the already-logged/already-added path.
+SUITE_MESSAGES = {
+    'greeting': "hello",
+    'help': "what can you do?",
+    'log': "log suite habit {n}",
+    'add_habit': "add habit suite habit {n}",
+    'missed': "check missed 30 days",
+    'calendar': "show calendar for run",
+    'show_habits': "show habits",
+    'export': "export data",
+}
+
+def suite_database(size):
+    """Returns a scratch copy of fixture `size`, generating the fixture if it isn't kept yet."""
+    users, habits, years = FIXTURES[size]
+    fixture = os.path.join(SUITE_FIXTURE_DIR, f'fixture_{size}_seed{SUITE_SEED}_{date.today().isoformat()}.db')
+    if not os.path.exists(fixture):
+        os.makedirs(SUITE_FIXTURE_DIR, exist_ok=True)
+        partial = fixture + '.partial'
+        if os.path.exists(partial):
+            os.remove(partial)
+        generate_data(partial, users, habits, years, seed=SUITE_SEED)
+        os.replace(partial, fixture)
+    path = os.path.join(WORKDIR, f'suite_{size}.db')
+    shutil.copyfile(fixture, path)
+    return path
+
+def calibration_workload():
+    """A fixed pure-Python workload; suite timings are compared relative to it."""
+    return sum(i * i for i in range(20000))
+
+def run_suite(size):
+    """Times every hot path on fixture `size` as the local user. Returns {path: best ms}.
+
+    Paths are timed in SUITE_REPEAT interleaved rounds, one call each per round,
+    so a slow stretch of the run hits every path (and the calibration) alike.
+    The report cache is emptied before every call, so reports are computed each time.
+    """
+    use_database(suite_database(size))
+    cold_bitsets()
+    client = local_client()
+
+    fresh = itertools.count()
+    paths = {f"chatbot_response[{intent}]": lambda message=message: app.chatbot_response(message.format(n=next(fresh)))
+             for intent, message in SUITE_MESSAGES.items()}
+    paths.update({
+        "calculate_streak": lambda: app.calculate_streak('Run'),
+        "show_detailed_habits": app.show_detailed_habits,
+        "missed_habits_report": lambda: app.missed_habits_report(30),
+        "export_data_to_csv": lambda: sum(len(chunk) for chunk in app.export_data_to_csv()),
+        "POST /get[show_habits]": lambda: client.post('/get', data={'msg': 'show habits'}),
+        "POST /get[log]": lambda: client.post('/get', data={'msg': SUITE_MESSAGES['log'].format(n=next(fresh))}),
+        "GET /download_logs": lambda: client.get('/download_logs').data,
+        SUITE_CALIBRATION: calibration_workload,
+    })
+    best = dict.fromkeys(paths, float('inf'))
+    for _ in range(SUITE_REPEAT):
+        for path, fn in paths.items():
+            cold_cache()
+            started = time.perf_counter()
+            fn()
+            best[path] = min(best[path], (time.perf_counter() - started) * 1000)
+    return best
+
+def bench_suite(sizes=SUITE_SIZES, baseline=SUITE_BASELINE, save_baseline=False, threshold=SUITE_THRESHOLD):
+    """Hot paths across fixture sizes, compared with (or saved as) the JSON baseline."""
+    results = {size: run_suite(size) for size in sizes}
+    previous = {}
+    if os.path.exists(baseline) and not save_baseline:
+        with open(baseline) as f:
+            previous = json.load(f)["results"]
+
+    regressions = []
+    for size, paths in results.items():
+        recorded = previous.get(size, {})
+        # > 1 when this run's machine (or CPU, this time around) is slower than the baseline's
+        scale = paths[SUITE_CALIBRATION] / recorded[SUITE_CALIBRATION] if SUITE_CALIBRATION in recorded else 1.0
+        for path, ms in paths.items():
+            line = f"suite    {size:<4} {path:<32} {ms:9.3f} ms"
+            before = recorded.get(path)
+            if before is not None and path != SUITE_CALIBRATION:
+                before *= scale
+                change = (ms - before) / before * 100 if before else 0.0
+                line += f"   baseline {before:9.3f} ms {change:+7.1f}%"
+                if change > threshold and ms - before > SUITE_NOISE_MS:
+                    regressions.append((size, path))
+                    line += "   REGRESSION"
+            print(line)
+
+    if save_baseline:
+        with open(baseline, 'w') as f:
+            json.dump({"created": datetime.now().isoformat(timespec='seconds'), "seed": SUITE_SEED,
+                       "results": results}, f, indent=2, sort_keys=True)
+        print(f"suite    baseline saved to {baseline}")
+    elif not previous:
+        print(f"suite    no baseline at {baseline}; run with --save-baseline to record one")
+    if regressions:
+        print(f"suite    {len(regressions)} paths regressed more than {threshold:g}%")
+        sys.exit(1)
+
+BENCHMARKS = {
+    'missed': bench_missed,
+    'streaks': bench_streaks,
+    'intents': bench_intents,
+    'heatmap': bench_heatmap,
+    'rollups': bench_rollups,
+    'users': bench_users,
+    'shards': bench_shards,
+    'cache': bench_cache_coherence,
+    'suite': bench_suite,
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="MindfulMe benchmarks.")
+    parser.add_argument('names', nargs='*', metavar='name', help=f"benchmarks to run (default all): {', '.join(BENCHMARKS)}")
+    parser.add_argument('--sizes', default=','.join(SUITE_SIZES),
+                        help=f"suite: comma-separated fixture sizes, from {', '.join(FIXTURES)}")
+    parser.add_argument('--baseline', default=SUITE_BASELINE, help="suite: baseline JSON file")
+    parser.add_argument('--save-baseline', action='store_true', help="suite: record this run as the baseline")
+    parser.add_argument('--threshold', type=float, default=SUITE_THRESHOLD,
+                        help="suite: percent slowdown that fails the run")
+    args = parser.parse_args()
+
+    sizes = args.sizes.split(',')
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark '{name}'; choose from {', '.join(BENCHMARKS)}")
+    for size in sizes:
+        if size not in FIXTURES:
+            parser.error(f"unknown fixture size '{size}'; choose from {', '.join(FIXTURES)}")
+
+    for name in args.names or list(BENCHMARKS):
+        if name == 'suite':
+            bench_suite(sizes, args.baseline, args.save_baseline, args.threshold)
+        else:
+            BENCHMARKS[name]()
@@ -0,0 +1,565 @@
+# storage.py
+import sqlite3
+import threading
+import queue
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date
+
+# PRAGMAs applied once, when a pooled connection is first opened
+CONNECT_PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -8000",  # ~8 MB page cache per connection
+)
+
+# Extra PRAGMAs for the 'wal' storage mode (readers never block the writer)
+WAL_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+)
+
+def open_connection(database, timeout, pragmas):
+    """Opens a connection with Row results and the given PRAGMAs applied."""
+    conn = sqlite3.connect(database, timeout=timeout, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    for pragma in pragmas:
+        conn.execute(pragma)
+    return conn
+
+def is_healthy(conn):
+    """Checks that a pooled connection still answers queries."""
+    try:
+        conn.execute("SELECT 1")
+        return True
+    except sqlite3.Error:
+        return False
+
+# --- Connection Pool ---
+
+class ConnectionPool:
+    """A bounded pool of SQLite connections.
+
+    A thread that already holds a connection gets the same one back when it
+    asks again, so nested helpers (log_activity -> fetch_all -> ...) share a
+    single connection instead of opening a new one each time.
+    """
+
+    def __init__(self, database, size=5, timeout=30.0, pragmas=()):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = CONNECT_PRAGMAS + tuple(pragmas)
+        self._idle = queue.LifoQueue()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open = 0
+        self._counters = {"hits": 0, "waits": 0, "created": 0, "discarded": 0}
+
+    def _count(self, key):
+        with self._lock:
+            self._counters[key] += 1
+
+    def _connect(self):
+        return open_connection(self.database, self.timeout, self.pragmas)
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._open -= 1
+            self._counters["discarded"] += 1
+
+    def _checkout(self):
+        """Takes an idle connection, opens a new one, or waits for one to be released."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._open < self.size
+                    if can_create:
+                        self._open += 1
+                        self._counters["created"] += 1
+                    else:
+                        self._counters["waits"] += 1
+                if can_create:
+                    try:
+                        return self._connect()
+                    except sqlite3.Error:
+                        with self._lock:
+                            self._open -= 1
+                        raise
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise sqlite3.OperationalError("Timed out waiting for a database connection.")
+            else:
+                self._count("hits")
+
+            if is_healthy(conn):
+                return conn
+            self._discard(conn)
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Yields a connection, reusing the one this thread already holds if any."""
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            self._local.depth += 1
+            self._count("hits")
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._checkout()
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            yield conn
+        finally:
+            self._local.depth -= 1
+            self._local.conn = None
+            self._release(conn)
+
+    def stats(self):
+        """Returns a snapshot of the pool counters."""
+        with self._lock:
+            snapshot = dict(self._counters)
+            snapshot["open"] = self._open
+        snapshot["idle"] = self._idle.qsize()
+        snapshot["size"] = self.size
+        return snapshot
+
+    def close(self):
+        """Closes every idle connection."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+# --- Sharded Connections ---
+
+class ShardedPool:
+    """Connections to many SQLite files (one per shard), at most max_open of them open at once.
+
+    Idle connections are kept in least-recently-used order, so a shard's next
+    request reuses a warm connection and its page cache; opening one more than
+    max_open closes the coldest idle connection first. prepare(shard, path) runs
+    once per shard and process before its first connection (create, migrate).
+    As in ConnectionPool, a thread that holds a shard's connection gets it back.
+    """
+
+    def __init__(self, path_for, max_open=64, timeout=30.0, pragmas=(), prepare=None):
+        self.path_for = path_for
+        self.max_open = max_open
+        self.timeout = timeout
+        self.pragmas = CONNECT_PRAGMAS + tuple(pragmas)
+        self.prepare = prepare
+        self._idle = OrderedDict()  # shard -> idle connections, least recently used shard first
+        self._prepared = set()
+        self._local = threading.local()
+        self._cond = threading.Condition()
+        self._open = 0
+        self._counters = {"hits": 0, "waits": 0, "created": 0, "evicted": 0, "discarded": 0}
+
+    def _take_idle(self, shard):
+        conns = self._idle[shard]
+        conn = conns.pop()
+        if not conns:
+            del self._idle[shard]
+        return conn
+
+    def _open_connection(self, shard):
+        path = self.path_for(shard)
+        with self._cond:
+            prepared = shard in self._prepared
+        if not prepared and self.prepare is not None:
+            self.prepare(shard, path)
+        with self._cond:
+            self._prepared.add(shard)
+        return open_connection(path, self.timeout, self.pragmas)
+
+    def _checkout(self, shard):
+        """Reuses an idle connection to the shard, or opens one, evicting or waiting if at max_open."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            evicted = None
+            with self._cond:
+                while True:
+                    if shard in self._idle:
+                        conn = self._take_idle(shard)
+                        self._counters["hits"] += 1
+                        break
+                    if self._open < self.max_open:
+                        self._open += 1
+                    elif self._idle:
+                        # Close the coldest idle connection; the new one takes its slot
+                        evicted = self._take_idle(next(iter(self._idle)))
+                        self._counters["evicted"] += 1
+                    else:
+                        self._counters["waits"] += 1
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or not self._cond.wait(remaining):
+                            raise sqlite3.OperationalError("Timed out waiting for a database connection.")
+                        continue
+                    self._counters["created"] += 1
+                    conn = None
+                    break
+
+            if evicted is not None:
+                evicted.close()
+            if conn is None:
+                try:
+                    return self._open_connection(shard)
+                except Exception:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    raise
+            if is_healthy(conn):
+                return conn
+            conn.close()
+            with self._cond:
+                self._open -= 1
+                self._counters["discarded"] += 1
+
+    def _release(self, shard, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._cond:
+            self._idle.setdefault(shard, []).append(conn)
+            self._idle.move_to_end(shard)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, shard):
+        """Yields a connection to `shard`, reusing the one this thread already holds if any."""
+        held = getattr(self._local, "held", None)
+        if held is None:
+            held = self._local.held = {}
+        if shard in held:
+            conn, depth = held[shard]
+            held[shard] = (conn, depth + 1)
+            try:
+                yield conn
+            finally:
+                conn, depth = held[shard]
+                held[shard] = (conn, depth - 1)
+            return
+
+        conn = self._checkout(shard)
+        held[shard] = (conn, 1)
+        try:
+            yield conn
+        finally:
+            del held[shard]
+            self._release(shard, conn)
+
+    def stats(self):
+        """Returns a snapshot of the pool counters."""
+        with self._cond:
+            snapshot = dict(self._counters)
+            snapshot["open"] = self._open
+            snapshot["idle"] = sum(len(conns) for conns in self._idle.values())
+            snapshot["idle_shards"] = len(self._idle)
+        snapshot["max_open"] = self.max_open
+        return snapshot
+
+    def close(self):
+        """Closes every idle connection."""
+        with self._cond:
+            idle = [conn for conns in self._idle.values() for conn in conns]
+            self._idle.clear()
+            self._open -= len(idle)
+        for conn in idle:
+            conn.close()
+
+class ShardLocal:
+    """Per-shard in-memory state, made by factory() on first use and kept for the max_shards most recently used."""
+
+    def __init__(self, factory, max_shards=256):
+        self.factory = factory
+        self.max_shards = max_shards
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, shard):
+        """Returns the shard's state, creating it (and dropping the coldest) if needed."""
+        with self._lock:
+            item = self._items.get(shard)
+            if item is None:
+                item = self._items[shard] = self.factory()
+                if len(self._items) > self.max_shards:
+                    self._items.popitem(last=False)
+            else:
+                self._items.move_to_end(shard)
+            return item
+
+    def values(self):
+        """Returns a snapshot of every shard's state currently kept."""
+        with self._lock:
+            return list(self._items.values())
+
+    def __len__(self):
+        return len(self._items)
+
+# --- Single Writer Thread ---
+
+class DatabaseWriter:
+    """Runs every write on one dedicated thread and commits them in groups.
+
+    Callers hand in a job, a function taking a connection, and block until the
+    transaction containing it has committed. Each job runs inside its own
+    SAVEPOINT, so one failing job (e.g. an IntegrityError) does not undo the
+    others sharing its commit.
+    """
+
+    def __init__(self, connect, max_queue=1000, max_batch=100, timeout=30.0):
+        # Connect here rather than on the thread so a bad database fails loudly at startup
+        self._conn = connect()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._metrics = {"jobs": 0, "batches": 0, "failed_jobs": 0,
+                         "commit_ms_total": 0.0, "commit_ms_last": 0.0, "commit_ms_max": 0.0}
+        self._thread = threading.Thread(target=self._run, name="mindfulme-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, job):
+        """Queues job(conn), waits for its group commit and returns the job's result."""
+        done = threading.Event()
+        outcome = {}
+        try:
+            self._queue.put((job, done, outcome), timeout=self.timeout)
+        except queue.Full:
+            raise sqlite3.OperationalError("Write queue is full, try again shortly.")
+        done.wait()
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome.get("result")
+
+    def _run(self):
+        conn = self._conn
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                running = False
+                batch = [item for item in batch if item is not None]
+            if batch:
+                self._commit_batch(conn, batch)
+        conn.close()
+
+    def _commit_batch(self, conn, batch):
+        started = time.perf_counter()
+        failed = 0
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for job, _, outcome in batch:
+                conn.execute("SAVEPOINT job")
+                try:
+                    outcome["result"] = job(conn)
+                    conn.execute("RELEASE job")
+                except Exception as error:
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    outcome["error"] = error
+                    failed += 1
+            conn.commit()
+        except sqlite3.Error as error:
+            if conn.in_transaction:
+                conn.rollback()
+            for _, _, outcome in batch:
+                outcome.pop("result", None)
+                outcome.setdefault("error", error)
+            failed = len(batch)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._metrics["jobs"] += len(batch)
+            self._metrics["batches"] += 1
+            self._metrics["failed_jobs"] += failed
+            self._metrics["commit_ms_total"] += elapsed_ms
+            self._metrics["commit_ms_last"] = elapsed_ms
+            self._metrics["commit_ms_max"] = max(self._metrics["commit_ms_max"], elapsed_ms)
+        for _, done, _ in batch:
+            done.set()
+
+    def stats(self):
+        """Returns queue depth and commit latency metrics."""
+        with self._lock:
+            snapshot = dict(self._metrics)
+        batches = snapshot["batches"] or 1
+        snapshot["commit_ms_avg"] = snapshot["commit_ms_total"] / batches
+        snapshot["avg_batch_size"] = snapshot["jobs"] / batches
+        snapshot["queue_depth"] = self._queue.qsize()
+        return snapshot
+
+    def close(self):
+        """Stops the writer thread once everything already queued is committed."""
+        self._queue.put(None)
+        self._thread.join()
+
+# --- Report Cache ---
+
+class VersionedCache:
+    """A bounded LRU cache for values derived from the database.
+
+    Each entry keeps the data version it was computed at, and a lookup only hits
+    at the caller's current version, so entries for different users can follow
+    different change counters without one user's writes evicting another's.
+    Entries are also dropped when the local date changes, since streaks and
+    "missed" reports depend on what today is.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (version, value)
+        self._lock = threading.Lock()
+        self._day = date.today()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get_or_compute(self, key, compute, version):
+        """Returns the cached value for key at `version`, calling compute() and storing it on a miss."""
+        with self._lock:
+            today = date.today()
+            if today != self._day:
+                if self._entries:
+                    self._entries.clear()
+                    self._counters["invalidations"] += 1
+                self._day = today
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return entry[1]
+            if entry is not None and entry[0] < version:
+                del self._entries[key]
+                self._counters["invalidations"] += 1
+            self._counters["misses"] += 1
+
+        value = compute()
+
+        with self._lock:
+            # Never replace a value computed at a newer version, or store one from yesterday
+            entry = self._entries.get(key)
+            if today == self._day and (entry is None or entry[0] <= version):
+                self._entries[key] = (version, value)
+                self._entries.move_to_end(key)
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._counters["evictions"] += 1
+        return value
+
+    def stats(self):
+        """Returns hit/miss counters and the current size."""
+        with self._lock:
+            snapshot = dict(self._counters)
+            snapshot["entries"] = len(self._entries)
+        return snapshot
+
+# --- Completion Bitsets ---
+
+class CompletionIndex:
+    """In-memory per-habit completion bitsets, indexed by day ordinal.
+
+    Each habit (keyed by habit id) maps to (first_day, bits): bit i of the int is
+    set when the habit was logged on day first_day + i. Streaks, range counts and
+    missed days are then shifts, masks and bit counts instead of queries or date sets.
+    refresh() only loads rows changed since the version it last saw.
+    """
+
+    def __init__(self):
+        self._bitsets = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def refresh(self, version, load):
+        """Brings the index up to `version` and returns it.
+
+        load(since) returns (habit, first_day, bits BLOB) rows changed after
+        version `since`, or every row when since is None.
+        """
+        with self._lock:
+            if self._version is None or version > self._version:
+                for habit, first_day, blob in load(self._version):
+                    self._bitsets[habit] = (first_day, int.from_bytes(blob, "little"))
+                self._version = version
+        return self
+
+    def last_day(self, habit):
+        """Returns the day ordinal of the habit's latest completion, or None."""
+        first_day, bits = self._bitsets.get(habit, (0, 0))
+        return first_day + bits.bit_length() - 1 if bits else None
+
+    def run_ending(self, habit, day):
+        """Returns the length of the run of consecutive completions ending on `day`."""
+        first_day, bits = self._bitsets.get(habit, (0, 0))
+        offset = day - first_day
+        if offset < 0 or not bits >> offset & 1:
+            return 0
+        gaps = ~bits & ((1 << (offset + 1)) - 1)
+        return offset + 1 - gaps.bit_length()
+
+    def longest_run(self, habit):
+        """Returns the habit's longest run of consecutive completions."""
+        bits = self._bitsets.get(habit, (0, 0))[1]
+        length = 0
+        while bits:  # each pass shortens every run by one day
+            bits &= bits >> 1
+            length += 1
+        return length
+
+    def window(self, habit, start, end):
+        """Returns the habit's bits for days start..end, with bit 0 being `start`."""
+        first_day, bits = self._bitsets.get(habit, (0, 0))
+        shift = start - first_day
+        bits = bits >> shift if shift >= 0 else bits << -shift
+        return bits & ((1 << (end - start + 1)) - 1) if end >= start else 0
+
+    def count_between(self, habit, start, end):
+        """Returns how many days in start..end (inclusive) the habit was completed."""
+        return self.window(habit, start, end).bit_count()
+
+    def missing_between(self, habit, start, end):
+        """Returns the days in start..end (inclusive) the habit wasn't completed, latest first."""
+        if end < start:
+            return []
+        missing = ~self.window(habit, start, end) & ((1 << (end - start + 1)) - 1)
+        days = []
+        while missing:
+            top = missing.bit_length() - 1
+            days.append(start + top)
+            missing ^= 1 << top
+        return days
+
+    def stats(self):
+        """Returns the number of habits, their packed size in bytes and the loaded version."""
+        with self._lock:
+            bitsets = list(self._bitsets.values())
+            version = self._version
+        return {
+            "habits": sum(1 for _, bits in bitsets if bits),
+            "bytes": sum((bits.bit_length() + 7) // 8 for _, bits in bitsets),
+            "version": version,
+        }